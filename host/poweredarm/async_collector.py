@@ -0,0 +1,87 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from poweredarm.collector import (BlockWriter, FrameParser, BinaryFrameParser,
+                                  read_available)
+from poweredarm.data_processing import open_source
+
+class DeviceCollector:
+    """
+    Collects labelled frames from one device, such as a serial port, into its
+    own data file. Every frame is timestamped with the monotonic clock when
+    the bytes completing it were read, in seconds since the collection
+    started, and the timestamps are saved to filename + '.times.npy' with one
+    per row of the data file.
+    """
+    def __init__(self, source, filename, label, binary=False, chunk_size=4096, timeout=0.05):
+        self.source = source
+        self.filename = filename
+        self.label = label
+        self.binary = binary
+        self.parser = BinaryFrameParser() if binary else FrameParser()
+        self.chunk_size = chunk_size
+        # How long a blocking read waits, which bounds how late a collection stops
+        self.timeout = timeout
+        self.times = []
+
+    @property
+    def times_filename(self):
+        return self.filename + '.times.npy'
+
+    async def run(self, duration, start, executor):
+        """
+        Collect until duration seconds after the monotonic time start, or until
+        a replayed file ends. Opening, reading and writing happen on the
+        executor's threads, so they never block the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        stream = await loop.run_in_executor(executor, open_source, self.source, self.timeout,
+                                            self.binary)
+        # Only a serial port has data waiting, and an empty read from it is a timeout
+        replay = not hasattr(stream, 'in_waiting')
+        try:
+            writer = BlockWriter(self.filename, self.label)
+            try:
+                while time.monotonic() < start + duration:
+                    data = await loop.run_in_executor(
+                        executor, read_available, stream, self.chunk_size)
+                    received = time.monotonic() - start
+                    if not data:
+                        if replay:
+                            break
+                        continue
+                    frames = self.parser.feed(data)
+                    if frames.shape[0]:
+                        self.times.append(np.full(frames.shape[0], received))
+                        await loop.run_in_executor(executor, writer.write, frames)
+            finally:
+                await loop.run_in_executor(executor, writer.close)
+        finally:
+            stream.close()
+        times = np.concatenate(self.times) if self.times else np.zeros(0)
+        await loop.run_in_executor(executor, np.save, self.times_filename, times)
+
+    def counters(self):
+        return {
+            'frames': self.parser.frames,
+            'malformed': self.parser.malformed,
+        }
+
+async def collect_devices(devices, duration):
+    """
+    Run DeviceCollectors concurrently for duration seconds, sharing the same
+    start time so that their timestamps can be compared. Returns the
+    counters of each device.
+    """
+    # Each device needs a thread for its blocking reads, plus one to write
+    with ThreadPoolExecutor(2 * len(devices)) as executor:
+        start = time.monotonic()
+        await asyncio.gather(*(device.run(duration, start, executor) for device in devices))
+    return [device.counters() for device in devices]
+
+def collect_from_devices(devices, duration=15):
+    """
+    Collect from several devices at once. Blocks until done.
+    """
+    return asyncio.run(collect_devices(devices, duration))
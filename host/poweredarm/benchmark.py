@@ -0,0 +1,119 @@
+import json
+import os
+import tempfile
+import time
+from os import path
+import numpy as np
+from poweredarm.classifier import LinearClassifier
+from poweredarm.data_processing import aggregate_csv
+
+def synthetic_data(m, num_features, num_classes, seed=0):
+    """
+    Generate m samples of EMG-like integer data with a label in the last
+    column, where each class has its own mean magnitude for each feature
+    """
+    rng = np.random.RandomState(seed)
+    means = rng.randint(20, 600, (num_classes, num_features))
+    y = rng.randint(0, num_classes, m)
+    X = np.abs(means[y, :] + rng.normal(0, 40, (m, num_features))).round()
+    return np.c_[ X, y ].astype(np.float32)
+
+def write_synthetic_csvs(directory, num_files, rows_per_file, seed=0):
+    """
+    Write num_files CSV data files of synthetic data, like recorded sessions
+    """
+    files = []
+    for i in range(num_files):
+        fname = path.join(directory, 'synthetic-{}.csv'.format(i))
+        np.savetxt(fname, synthetic_data(rows_per_file, 8, 4, seed + i), fmt='%d', delimiter=',')
+        files.append(fname)
+    return files
+
+def measure(fn, repeat=3):
+    """
+    Returns the fastest of repeat runs of fn in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def _trained(m, num_features, num_classes):
+    data = synthetic_data(m, num_features, num_classes)
+    classifier = LinearClassifier(num_classes=num_classes, num_features=num_features)
+    classifier.train(data[:, :-1], data[:, -1], optimizer='newton', num_iter=5)
+    return classifier, data
+
+def run_benchmarks(quick=False, repeat=3):
+    """
+    Run every benchmark on synthetic data. Returns a dict mapping each
+    benchmark's name to a dict with its time in seconds, and its throughput in
+    samples per second where that makes sense.
+    """
+    results = {}
+
+    def record(name, fn, samples=None):
+        seconds = measure(fn, repeat)
+        results[name] = {'seconds': seconds}
+        if samples is not None:
+            results[name]['samples_per_second'] = samples / seconds
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for num_files in ([2] if quick else [10, 100]):
+            files = write_synthetic_csvs(tmpdir, num_files, 750)
+            record('aggregate_csv/{}-files/uncached'.format(num_files),
+                   lambda: aggregate_csv(files, cache=False), num_files * 750)
+            # Fill the cache before timing it
+            aggregate_csv(files)
+            record('aggregate_csv/{}-files/cached'.format(num_files),
+                   lambda: aggregate_csv(files), num_files * 750)
+
+    train_sizes = [(1000, 8, 4)] if quick else [(1000, 8, 4), (20000, 8, 4), (20000, 32, 10)]
+    for m, n, c in train_sizes:
+        data = synthetic_data(m, n, c)
+        X, y = data[:, :-1], data[:, -1]
+        for optimizer, args in [('gradient_descent', {'rate': 0.001, 'num_iter': 100}),
+                                ('newton', {'num_iter': 10, 'tol': 0})]:
+            record('train/{}/{}x{}x{}'.format(optimizer, m, n, c),
+                   lambda: LinearClassifier(c, n).train(X, y, optimizer=optimizer, **args), m)
+
+    m = 10000 if quick else 200000
+    classifier, data = _trained(m, 8, 4)
+    X, y = data[:, :-1], data[:, -1]
+    record('predict/{}'.format(m), lambda: classifier.predict(X), m)
+    record('evaluate/{}'.format(m), lambda: classifier.evaluate(X, y), m)
+
+    classifier, _ = _trained(1000, 32, 10)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        header = path.join(tmpdir, 'classifier.h')
+        record('to_header/32x10', lambda: classifier.to_header('benchmark', header))
+
+    return results
+
+def compare(results, baseline, threshold):
+    """
+    Compare results to a baseline from a previous run. Returns a list of
+    (name, baseline seconds, seconds) for every benchmark that got more than
+    threshold percent slower.
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        before = baseline[name]['seconds']
+        if result['seconds'] > before * (1 + threshold / 100):
+            regressions.append((name, before, result['seconds']))
+    return regressions
+
+def save_results(results, filename):
+    directory = path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(filename, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+
+def load_results(filename):
+    with open(filename, 'r') as file:
+        return json.load(file)
@@ -1,8 +1,74 @@
+import struct
+import zlib
 import numpy as np
+from poweredarm import profiling
+from poweredarm.features import FeatureExtractor
+from poweredarm.metrics import ConfusionMatrix, accuracy_recall, confusion_matrix
+
+def c_array(arr):
+    """
+    C initializer list of an array. Floats are converted to float32 like on the
+    target, and written with 9 significant digits, which is enough to read
+    back the exact same float, so the output only depends on the values.
+    """
+    arr = np.asarray(arr)
+    if arr.dtype.kind == 'f':
+        arr = arr.astype(np.float32)
+        assert np.all(np.isfinite(arr))
+        values = ['{:.9g}'.format(value) for value in arr.ravel().tolist()]
+    else:
+        values = [str(value) for value in arr.ravel().tolist()]
+    # Join the innermost rows first, then each enclosing dimension in turn
+    for length in reversed(arr.shape):
+        values = ['{' + ','.join(values[i:i + length]) + '}'
+                  for i in range(0, len(values), length)]
+    return values[0]
+
+# A model blob is this header followed by the weight, offset and divisor as
+# little endian float32. The CRC-32 covers everything after the header.
+BLOB_MAGIC = b'PACL'
+BLOB_VERSION = 1
+BLOB_HEADER = struct.Struct('<4sHHHHI')
 
 def sigmoid(z):
     return 1 / (1 + np.exp(-z))
 
+def time_decay(rate, decay):
+    """
+    Learning rate schedule for train_minibatch() that decays as rate / (1 + decay * epoch)
+    """
+    return lambda epoch: rate / (1 + decay * epoch)
+
+class RunningScaler:
+    """
+    Tracks the feature scaling parameters of a growing dataset using running
+    sums, so the data seen so far never needs to be rescanned.
+    """
+    def __init__(self, num_features):
+        self.count = 0
+        self.total = np.zeros(num_features)
+        self.minimum = np.full(num_features, np.inf)
+        self.maximum = np.full(num_features, -np.inf)
+
+    def update(self, X):
+        """
+        Add the m * n samples of X to the running statistics
+        """
+        if X.shape[0] == 0:
+            return
+        self.count += X.shape[0]
+        self.total += np.sum(X, 0)
+        np.minimum(self.minimum, np.min(X, 0), out=self.minimum)
+        np.maximum(self.maximum, np.max(X, 0), out=self.maximum)
+
+    @property
+    def offset(self):
+        return self.total / self.count
+
+    @property
+    def divisor(self):
+        return self.maximum - self.minimum
+
 class LinearClassifier:
     def __init__(self, num_classes, num_features, init_weight=None):
         assert num_classes >= 2
@@ -13,6 +79,8 @@ class LinearClassifier:
         self.num_features = num_features
         # n+1 * c matrix
         self.weight = np.zeros((num_features + 1, num_classes), dtype=np.float32)
+        # FeatureExtractor the classifier was trained on, or None for raw samples
+        self.features = None
 
         if init_weight is not None:
             # Dependency injection for testing
@@ -33,6 +101,18 @@ class LinearClassifier:
         # y -> m vector
         assert y.shape == (X.shape[0],)
 
+    def _cost_from_scores(self, z, Y):
+        """
+        Logistic regression cost fn given the m * c scores z = X @ weight.
+        Uses the identities -log(h(X)) = log(1 + e^-z) = log(1 + e^z) - z and
+        -log(1-h(X)) = log(1 + e^z), which simplify the cost to
+        sum( log(1 + e^z) - y * z ) / m. log(1 + e^z) is computed in a way that
+        doesn't overflow when h saturates to 0 or 1.
+        """
+        softplus = np.log1p(np.exp(-np.abs(z))) + np.maximum(z, 0)
+        # Produces array of c
+        return np.sum(softplus - Y * z, 0) / Y.shape[0]
+
     def cost(self, X, y):
         """
         Logistic regression cost fn = sum( y * log(h(X)) + (1-y) * log(1-h(X)) ) / m
@@ -40,11 +120,9 @@ class LinearClassifier:
         m = y.shape[0]
         # Y -> m * c
         Y = self._transform_y(y, m)
-        # h -> m * c
-        h = sigmoid(X @ self.weight)
-        # Logistic regression cost fn, produces array of c
-        cost = - np.sum(Y * np.log(h) + (1 - Y) * np.log(1 - h), 0) / m
-        return cost
+        # z -> m * c
+        z = X @ self.weight
+        return self._cost_from_scores(z, Y)
 
     def cost_delta(self, X, y):
         """
@@ -76,6 +154,98 @@ class LinearClassifier:
         # return num_iter * c matrix of costs for each class
         return np.array(costs)
 
+    def fused_gradient_descent(self, X, y, rate, num_iter, cost_every=1, l2=0.):
+        """
+        Gradient descent on the logistic regression cost. Unlike
+        gradient_descent(), each forward pass is shared between the gradient and
+        the cost, Y is only built once, and buffers are reused between iterations.
+
+        :param X: m * n+1 matrix of scaled features with a column of ones.
+        :param y: m vector of class numbers.
+        :param rate: Learning rate. Should be a number.
+        :param num_iter: Number of iterations to use.
+        :param cost_every: Record the cost after every this many iterations.
+        Never record it if 0 or None.
+        :param l2: Strength of an L2 penalty on the weights, like the damping
+        of newton(). The recorded costs don't include the penalty.
+        :returns: num_iter / cost_every * c matrix of recorded costs.
+        """
+        m = y.shape[0]
+        # Y -> m * c
+        Y = self._transform_y(y, m)
+        # z -> m * c, holds the scores of the current weights
+        z = X @ self.weight
+        # h -> m * c
+        h = np.empty_like(z)
+        # delta -> n+1 * c
+        delta = np.empty(self.weight.shape, dtype=z.dtype)
+
+        profiler = profiling.active()
+        if profiler is not None:
+            profiler.reset_lap()
+            profiler.lap('gradient descent iterations', 0)
+
+        costs = []
+        for i in range(1, num_iter + 1):
+            # Compute h - Y = sigmoid(z) - Y in place
+            np.negative(z, out=h)
+            np.exp(h, out=h)
+            h += 1
+            np.reciprocal(h, out=h)
+            h -= Y
+            np.matmul(X.T, h, out=delta)
+            if l2:
+                delta += l2 * self.weight
+            delta *= rate
+            self.weight -= delta
+
+            record = cost_every and i % cost_every == 0
+            # The final forward pass is only needed for its cost
+            if i < num_iter or record:
+                np.matmul(X, self.weight, out=z)
+            if record:
+                costs.append(self._cost_from_scores(z, Y))
+            if profiler is not None and (i % profiler.every == 0 or i == num_iter):
+                profiler.lap('gradient descent iterations', (i - 1) % profiler.every + 1)
+        # return num_iter / cost_every * c matrix of costs
+        return np.array(costs).reshape(-1, self.num_classes)
+
+    def newton(self, X, y, num_iter=50, tol=1e-6, damping=1e-2):
+        """
+        Run Newton's method on the weight matrix. Each class is an independent
+        logistic regression, so each column of the weight gets its own
+        n+1 * n+1 Hessian X.T * diag(h(X) * (1-h(X))) * X.
+
+        :param X: m * n+1 matrix of scaled features with a column of ones.
+        :param y: m vector of class numbers.
+        :param num_iter: Maximum number of iterations to use.
+        :param tol: Stop once no class's cost changes by more than this.
+        :param damping: Strength of a small L2 penalty on the weights, which
+        keeps them finite when a class is linearly separable and the Hessian
+        would otherwise become singular.
+        :returns: List of cost function results from each iteration.
+        """
+        m = y.shape[0]
+        # Y -> m * c
+        Y = self._transform_y(y, m)
+        eye = damping * np.eye(X.shape[1])
+
+        costs = []
+        for i in range(num_iter):
+            # h -> m * c
+            h = sigmoid(X @ self.weight)
+            # gradient -> n+1 * c
+            gradient = X.T @ (h - Y) + damping * self.weight
+            # hessian -> c * n+1 * n+1
+            hessian = np.einsum('ki,kc,kj->cij', X, h * (1 - h), X) + eye
+            step = np.linalg.solve(hessian, gradient.T[:, :, None])[:, :, 0]
+            self.weight -= step.T
+            costs.append(self.cost(X, y))
+            profiling.count('newton iterations')
+            if i > 0 and np.all(np.abs(costs[-1] - costs[-2]) <= tol):
+                break
+        return np.array(costs)
+
     def scale_features(self, X):
         """
         With the right parameters this computes (X - mean(X)) / (max(X) - min(X))
@@ -83,35 +253,159 @@ class LinearClassifier:
         """
         return (X-self.offset[None, :]) / self.divisor[None, :]
 
-    def train(self, X, y, **optimization_args):
+    def fit_scaling(self, X):
         """
-        Train data via gradient descent. Calling this multiple times will not
-        improve accuracy after first time
+        Compute mean normalization feature scaling parameters from X
         """
-        self._check_data_shape(X, y)
-        # Compute mean normalization feature scaling parameters
         self.offset = np.mean(X, 0)
         self.divisor = np.max(X, 0) - np.min(X, 0)
 
-        # Add column of ones
-        X = np.c_[ np.ones(X.shape[0]), self.scale_features(X) ]
+    def folded_weight(self):
+        """
+        Fold the feature scaling parameters into the weight matrix. Returns a
+        n+1 * c matrix that produces the same scores as self.weight when applied
+        to unscaled features with a column of ones.
+        """
+        # Scale each feature row of the weight by its divisor
+        scaled = self.weight[1:, :] / self.divisor[:, None]
+        # Subtracting the offset only shifts the bias row
+        bias = self.weight[0, :] - self.offset @ scaled
+        return np.vstack([bias, scaled])
+
+    @profiling.timed('train')
+    def train(self, X, y, rescale=True, optimizer='gradient_descent', **optimization_args):
+        """
+        Train data via the optimizer, which is either a key of OPTIMIZERS or a
+        function taking the classifier, the scaled X with a column of ones, y
+        and the optimization args, and returning the cost of each iteration.
+        Calling this multiple times will not improve accuracy after first time,
+        but the weights are kept between calls, so training on a superset of
+        the data warm-starts from them. Passing rescale=False keeps the
+        existing scaling parameters.
+        """
+        self._check_data_shape(X, y)
+        if rescale:
+            self.fit_scaling(X)
+
+        # Add column of ones, writing the scaled features straight after it
+        X1 = np.empty((X.shape[0], self.num_features + 1))
+        X1[:, 0] = 1
+        np.subtract(X, self.offset, out=X1[:, 1:])
+        X1[:, 1:] /= self.divisor
+        X = X1
 
         # Run optimization function and return the costs for debugging
-        costs = self.gradient_descent(lambda: self.cost_delta(X, y),
-                                      lambda: self.cost(X, y),
-                                      **optimization_args)
+        if not callable(optimizer):
+            optimizer = OPTIMIZERS[optimizer]
+        costs = optimizer(self, X, y, **optimization_args)
         return costs
 
-    def predict(self, X):
+    def train_minibatch(self, chunks, batch_size=256, num_epochs=1,
+                        schedule=lambda epoch: 0.01, rng=np.random, rescale=True):
+        """
+        Train via mini-batch gradient descent, which is plain SGD when
+        batch_size is 1. The data is streamed in chunks, so it never needs to
+        fit in memory. The rows of each chunk are shuffled every epoch.
+
+        :param chunks: Function taking no input and returning an iterable of
+        (X, y) chunks. Called once per epoch, and once more to compute the
+        scaling parameters if rescale is set.
+        :param batch_size: Number of samples used for each gradient step.
+        :param num_epochs: Number of passes over the data.
+        :param schedule: Function taking the epoch number and returning the
+        learning rate, such as time_decay().
+        :param rng: RandomState used to shuffle the chunks.
+        :param rescale: Compute the scaling parameters from the data first.
+        :returns: num_epochs * c matrix of the mean cost over each epoch.
+        """
+        if rescale:
+            scaler = RunningScaler(self.num_features)
+            for X, y in chunks():
+                scaler.update(X)
+            self.offset, self.divisor = scaler.offset, scaler.divisor
+
+        # Scaled batches are written after a column of ones that is only set once
+        buffer = np.empty((batch_size, self.num_features + 1))
+        buffer[:, 0] = 1
+        costs = []
+        for epoch in range(num_epochs):
+            rate = schedule(epoch)
+            cost = np.zeros(self.num_classes)
+            m = 0
+            for X, y in chunks():
+                self._check_data_shape(X, y)
+                order = rng.permutation(X.shape[0])
+                for start in range(0, X.shape[0], batch_size):
+                    batch = order[start:start + batch_size]
+                    # The last batch of a chunk can be smaller
+                    Xb = buffer[:len(batch)]
+                    np.subtract(X[batch, :], self.offset[None, :], out=Xb[:, 1:])
+                    Xb[:, 1:] /= self.divisor[None, :]
+                    Y = self._transform_y(y[batch], len(batch))
+                    # One forward pass for both the cost and the gradient
+                    z = Xb @ self.weight
+                    cost += self._cost_from_scores(z, Y) * len(batch)
+                    m += len(batch)
+                    # Average the gradient so the rate doesn't depend on batch size
+                    self.weight -= rate * (Xb.T @ (sigmoid(z) - Y)) / len(batch)
+            costs.append(cost / m)
+        return np.array(costs)
+
+    def _score_chunks(self, X, chunk_rows):
+        """
+        Yield the start row and float32 class scores of each chunk of rows of
+        X. The features are scaled into a reused buffer, and the bias row is
+        added separately instead of adding a column of ones, so nothing is
+        upcast to float64 or copied whole. Each chunk's scores are only valid
+        until the next chunk.
+        """
         # X -> m * n
         assert X.shape[1] == self.num_features
-        # Add column to X, so X -> m * n+1
-        X = np.c_[ np.ones(X.shape[0]), self.scale_features(X) ]
-        # result -> m * c
-        result = X @ self.weight
-        # returns -> m array, where the ith sample is the predicted class for sample i
-        return np.argmax(result, 1)
+        weight = np.asarray(self.weight, dtype=np.float32)
+        offset = np.asarray(self.offset, dtype=np.float32)
+        divisor = np.asarray(self.divisor, dtype=np.float32)
+        rows = min(chunk_rows, X.shape[0])
+        features = np.empty((rows, self.num_features), dtype=np.float32)
+        scores = np.empty((rows, self.num_classes), dtype=np.float32)
+        for start in range(0, X.shape[0], chunk_rows):
+            end = min(start + chunk_rows, X.shape[0])
+            chunk_features, chunk_scores = features[:end - start], scores[:end - start]
+            np.subtract(X[start:end, :], offset, out=chunk_features)
+            chunk_features /= divisor
+            np.matmul(chunk_features, weight[1:, :], out=chunk_scores)
+            chunk_scores += weight[0, :]
+            yield start, chunk_scores
+
+    def predict_scores(self, X, out=None, chunk_rows=1024):
+        """
+        Score each class for unscaled features, in float32 and in chunks of
+        chunk_rows samples, which are small enough to stay in cache.
+
+        :param X: m * n matrix of unscaled features.
+        :param out: m * c float32 array to write the scores into. Allocated if None.
+        :returns: m * c matrix of scores, which is out if given.
+        """
+        if out is None:
+            out = np.empty((X.shape[0], self.num_classes), dtype=np.float32)
+        for start, scores in self._score_chunks(X, chunk_rows):
+            out[start:start + scores.shape[0], :] = scores
+        return out
+
+    def predict(self, X, out=None, chunk_rows=1024):
+        """
+        Predict the class of each sample, like predict_scores() without
+        keeping the scores of every sample.
+
+        :param out: m integer array to write the predictions into. Allocated if None.
+        :returns: m array, where the ith element is the predicted class of sample i.
+        """
+        if out is None:
+            out = np.empty(X.shape[0], dtype=np.intp)
+        for start, scores in self._score_chunks(X, chunk_rows):
+            np.argmax(scores, 1, out=out[start:start + scores.shape[0]])
+        return out
 
+    @profiling.timed('evaluate')
     def evaluate(self, X, y):
         """
         Run predictions on a test dataset and compare them to the expected results.
@@ -119,29 +413,27 @@ class LinearClassifier:
         recall for each class (samples predicted correctly / total samples)
         """
         self._check_data_shape(X, y)
+        return self.evaluate_predictions(self.predict(X), y)
 
-        def count(unique, counts):
-            class_counts = np.zeros(self.num_classes)
-            for cls, cnt in zip(unique, counts):
-                class_counts[int(cls)] = cnt
-            return class_counts
-
-        results = self.predict(X)
-        # bool array indicating whether each prediction was accurate
-        correct = results == y
-        # array of length c that tallies the # of samples from each class
-        class_counts = count(*np.unique(y, return_counts=True))
-        # array of that tallies the # of samples from each class predicted correctly
-        correct_counts = count(*np.unique(y[correct], return_counts=True))
-
-        # recall values for each class (samples predicted correctly / total sample set)
-        # if class doesn't exist in data set, return -1
-        recall_arr = np.divide(
-            correct_counts, class_counts,
-            out=np.full_like(class_counts, -1), where=class_counts != 0)
-        # number representing overall accuracy of all samples
-        accuracy = np.sum(correct) / len(y)
-        return (accuracy, recall_arr)
+    def evaluate_predictions(self, results, y):
+        """
+        Compare predicted classes to the expected results. Outputs the same
+        results as evaluate().
+        """
+        return accuracy_recall(confusion_matrix(y, results, self.num_classes))
+
+    def confusion(self, chunks):
+        """
+        Accumulate the confusion matrix of the predictions over an iterable of
+        (X, y) chunks, such as gather_batches() or iter_csv_chunks(), holding
+        only one chunk's predictions at a time. Returns a ConfusionMatrix,
+        which also gives the precision, recall, F1 score and support.
+        """
+        confusion = ConfusionMatrix(self.num_classes)
+        for X, y in chunks:
+            self._check_data_shape(X, y)
+            confusion.update(y, self.predict(X))
+        return confusion
 
     def __eq__(self, other):
         return (
@@ -152,17 +444,23 @@ class LinearClassifier:
             np.allclose(self.divisor, other.divisor)
         )
 
+    @profiling.timed('save')
     def save(self, filename):
         """
         Save all the fields of a trained classifier into a NPZ file
         """
+        extra = {}
+        if self.features is not None:
+            extra = {'feature_window': self.features.window,
+                     'feature_kinds': np.array(self.features.kinds)}
         np.savez(
             filename,
             num_features=self.num_features,
             num_classes=self.num_classes,
             weight=self.weight,
             offset=self.offset,
-            divisor=self.divisor
+            divisor=self.divisor,
+            **extra
         )
 
     @classmethod
@@ -176,23 +474,169 @@ class LinearClassifier:
                                           init_weight=npz['weight'])
             classifier.offset = npz['offset']
             classifier.divisor = npz['divisor']
+            if 'feature_window' in npz:
+                classifier.features = FeatureExtractor(int(npz['feature_window']),
+                                                       tuple(npz['feature_kinds']))
             return classifier
 
-    def to_header(self, classifier_file, filename):
+    @profiling.timed('to_header')
+    def to_header(self, classifier_file, filename, fixed_bits=None, features=None,
+                  smoothing=None):
         """
-        Convert classifier parameters into a C header file
+        Convert classifier parameters into a C header file. If fixed_bits is
+        given, also include the parameters of the equivalent FixedPointClassifier.
+        If the classifier was trained on windowed features, the header also
+        configures the target's feature extraction to match, using its
+        FeatureExtractor unless another is passed. The fixed point classifier
+        only supports raw integer features. Pass a PredictionSmoother to smooth
+        the target's predictions the same way.
         """
-        def convert_arr(arr):
-            return np.array2string(arr, separator=',', suppress_small=False)\
-                .replace('[', '{').replace(']', '}').replace('\n', '').replace(' ', '')
-
-        with open(filename, 'w') as file:
+        features = features or self.features
+        assert fixed_bits is None or features is None
+        # Always use \n, so the same model gives the same bytes on every platform
+        with open(filename, 'w', newline='\n') as file:
             def define(var, value):
                 file.write('#define {} {}\n'.format(var, value))
 
             file.write(f'/* Generated from {classifier_file} */\n')
             define('CLASSIFIER_NUM_FEATURES', self.num_features)
             define('CLASSIFIER_NUM_CLASSES', self.num_classes)
-            define('CLASSIFIER_WEIGHT', convert_arr(self.weight))
-            define('CLASSIFIER_OFFSET', convert_arr(self.offset))
-            define('CLASSIFIER_DIVISOR', convert_arr(self.divisor))
+            define('CLASSIFIER_WEIGHT', c_array(self.weight))
+            define('CLASSIFIER_OFFSET', c_array(self.offset))
+            define('CLASSIFIER_DIVISOR', c_array(self.divisor))
+
+            if features is not None:
+                for var, value in features.header_defines():
+                    define(var, value)
+
+            if smoothing is not None:
+                for var, value in smoothing.header_defines():
+                    define(var, value)
+
+            if fixed_bits is not None:
+                fixed = FixedPointClassifier.from_classifier(self, fixed_bits)
+                define('CLASSIFIER_FIXED_BITS', fixed.bits)
+                define('CLASSIFIER_FIXED_WEIGHT', c_array(fixed.weight))
+                define('CLASSIFIER_FIXED_BIAS', c_array(fixed.bias))
+                define('CLASSIFIER_FIXED_MULTIPLIER', c_array(fixed.multiplier))
+
+    def to_blob(self, filename):
+        """
+        Write the parameters into a binary blob, which the target can load
+        from flash with classifier_load_blob() instead of being recompiled.
+        The same parameters always produce the same bytes.
+        """
+        payload = b''.join(np.asarray(arr, dtype='<f4').tobytes()
+                           for arr in (self.weight, self.offset, self.divisor))
+        header = BLOB_HEADER.pack(BLOB_MAGIC, BLOB_VERSION, self.num_features,
+                                  self.num_classes, 0, zlib.crc32(payload))
+        with open(filename, 'wb') as file:
+            file.write(header + payload)
+
+    @classmethod
+    def from_blob(cls, filename):
+        """
+        Load a classifier from a blob created by to_blob()
+        """
+        with open(filename, 'rb') as file:
+            blob = file.read()
+        magic, version, n, c, _, crc = BLOB_HEADER.unpack_from(blob)
+        payload = blob[BLOB_HEADER.size:]
+        if (magic != BLOB_MAGIC or version != BLOB_VERSION or
+                len(payload) != 4 * ((n + 1) * c + 2 * n) or zlib.crc32(payload) != crc):
+            raise ValueError('{} is not a valid classifier blob'.format(filename))
+        values = np.frombuffer(payload, dtype='<f4').astype(np.float32)
+        classifier = LinearClassifier(num_classes=c, num_features=n,
+                                      init_weight=values[:(n + 1) * c].reshape(n + 1, c))
+        classifier.offset = values[(n + 1) * c:(n + 1) * c + n]
+        classifier.divisor = values[(n + 1) * c + n:]
+        return classifier
+
+class FixedPointClassifier:
+    """
+    Integer-only equivalent of a LinearClassifier for the target. The feature
+    scaling is folded into the weights, which are quantized with a separate
+    scale for each class. Each class's score is computed as
+    (bias + weight.T @ x) * multiplier, where the multiplier is that class's
+    scale relative to the largest scale in fixed point, so the scores can be
+    compared with only integer arithmetic.
+    """
+    # Bits of fractional precision of the multipliers
+    MULTIPLIER_BITS = 15
+
+    def __init__(self, weight, bias, multiplier, bits):
+        # n * c matrix of signed ints that fit in the given number of bits
+        self.weight = weight
+        # c vector of 32 bit ints
+        self.bias = bias
+        # c vector of ints up to 2^MULTIPLIER_BITS
+        self.multiplier = multiplier
+        self.bits = bits
+
+    @classmethod
+    def from_classifier(cls, classifier, bits=16):
+        """
+        Quantize a trained classifier. Supports 8 and 16 bit weights.
+        """
+        assert bits in (8, 16)
+        folded = classifier.folded_weight().astype(np.float64)
+        qmax = 2**(bits - 1) - 1
+        # c vector of the value of a unit of each class's quantized weights,
+        # which must also keep the bias within 32 bits
+        scale = np.maximum(np.max(np.abs(folded[1:, :]), 0) / qmax,
+                           np.abs(folded[0, :]) / (2**31 - 1))
+        scale[scale == 0] = 1
+
+        weight = np.round(folded[1:, :] / scale[None, :]).astype(np.int64)
+        bias = np.round(folded[0, :] / scale).astype(np.int64)
+        multiplier = np.round(scale / np.max(scale) * 2**cls.MULTIPLIER_BITS).astype(np.int64)
+        return cls(weight, bias, multiplier, bits)
+
+    def scores(self, X):
+        """
+        Compute the integer scores of a m * n matrix of integer features,
+        exactly as the target does. Returns a m * c matrix of int64.
+        """
+        X = np.rint(X).astype(np.int64)
+        return (X @ self.weight + self.bias[None, :]) * self.multiplier[None, :]
+
+    def predict(self, X):
+        # returns -> m array, where the ith sample is the predicted class for sample i
+        return np.argmax(self.scores(X), 1)
+
+    def agreement(self, classifier, X):
+        """
+        Fraction of samples of X for which the quantized predictions match the
+        predictions of the original classifier
+        """
+        return np.mean(self.predict(X) == classifier.predict(X))
+
+# Optimizers usable by LinearClassifier.train()
+OPTIMIZERS = {
+    'gradient_descent': LinearClassifier.fused_gradient_descent,
+    'newton': LinearClassifier.newton,
+}
+
+def predict_many(classifiers, X, chunk_rows=65536):
+    """
+    Predict with many classifiers at once. Their weights, with the feature
+    scaling folded in, are stacked into one k * n+1 * c tensor so that every
+    classifier scores a chunk of samples in a single batched matmul.
+
+    :param classifiers: List of k classifiers with the same numbers of features
+    and classes.
+    :param X: m * n matrix of unscaled features.
+    :param chunk_rows: Number of samples scored at a time, which bounds the
+    size of the k * chunk_rows * c scores.
+    :returns: k * m matrix of predicted classes.
+    """
+    # weights -> k * n+1 * c
+    weights = np.stack([classifier.folded_weight() for classifier in classifiers])
+    assert X.shape[1] + 1 == weights.shape[1]
+    predictions = np.empty((len(classifiers), X.shape[0]), dtype=np.intp)
+    for start in range(0, X.shape[0], chunk_rows):
+        chunk = np.asarray(X[start:start + chunk_rows, :], dtype=np.float64)
+        # scores -> k * chunk_rows * c
+        scores = chunk @ weights[:, 1:, :] + weights[:, :1, :]
+        np.argmax(scores, 2, out=predictions[:, start:start + chunk.shape[0]])
+    return predictions
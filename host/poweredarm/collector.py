@@ -0,0 +1,237 @@
+import queue
+import struct
+import threading
+import time
+from os import path
+import numpy as np
+from poweredarm.util import NUM_FEATURES
+
+class FrameParser:
+    """
+    Decodes the _DATA_ lines printed by the ESP32 from a stream of bytes. Bytes
+    can be fed in arbitrary chunks, and every complete frame in a chunk is
+    decoded at once.
+    """
+    def __init__(self):
+        self.remainder = b''
+        # Number of decoded frames
+        self.frames = 0
+        # Number of _DATA_ lines with missing or invalid values
+        self.malformed = 0
+
+    def feed(self, data):
+        """
+        Returns the frames completed by data as a n * NUM_FEATURES array
+        """
+        lines = (self.remainder + data).split(b'\n')
+        # The last line is incomplete, so keep it for the next chunk
+        self.remainder = lines.pop()
+
+        tokens = []
+        for line in lines:
+            if not line.startswith(b'_DATA_'):
+                continue
+            fields = line.split()[1:NUM_FEATURES + 1]
+            if len(fields) == NUM_FEATURES and all(f.isdigit() for f in fields):
+                tokens.extend(fields)
+            else:
+                self.malformed += 1
+
+        frames = np.array(tokens, dtype=bytes).astype(np.int32).reshape(-1, NUM_FEATURES)
+        self.frames += frames.shape[0]
+        return frames
+
+# Binary frames are a sync word, NUM_FEATURES little endian uint16 values and
+# a checksum, which is the sum of the values truncated to 16 bits
+FRAME_SYNC = b'\xa5\x5a'
+FRAME_WORDS = NUM_FEATURES + 2
+FRAME_SIZE = 2 * FRAME_WORDS
+
+def encode_frames(frames):
+    """
+    Encode a n * NUM_FEATURES array into binary frames, like the ESP32 does
+    """
+    frames = np.asarray(frames, dtype=np.uint16)
+    words = np.empty((frames.shape[0], FRAME_WORDS), dtype='<u2')
+    words[:, 0] = np.frombuffer(FRAME_SYNC, dtype='<u2')[0]
+    words[:, 1:-1] = frames
+    words[:, -1] = np.sum(frames, 1, dtype=np.uint16)
+    return words.tobytes()
+
+class BinaryFrameParser:
+    """
+    Decodes binary frames from a stream of bytes, which may also contain text
+    printed by the ESP32. Bytes can be fed in arbitrary chunks, and every
+    complete frame in a chunk is decoded at once.
+    """
+    def __init__(self):
+        self.remainder = b''
+        # Number of decoded frames
+        self.frames = 0
+        # Number of sync words followed by a frame with a bad checksum
+        self.malformed = 0
+
+    def feed(self, data):
+        """
+        Returns the frames completed by data as a n * NUM_FEATURES array
+        """
+        buf = self.remainder + data
+        raw = np.frombuffer(buf, dtype=np.uint8)
+        # Start of every sync word with a whole frame after it
+        starts = np.flatnonzero((raw[:-1] == FRAME_SYNC[0]) & (raw[1:] == FRAME_SYNC[1]))
+        starts = starts[starts + FRAME_SIZE <= len(buf)]
+
+        # Gather the candidate frames into a k * FRAME_WORDS array
+        candidates = raw[starts[:, None] + np.arange(FRAME_SIZE)].view('<u2')
+        valid = np.sum(candidates[:, 1:-1], 1, dtype=np.uint16) == candidates[:, -1]
+        self.malformed += np.count_nonzero(~valid)
+        starts = starts[valid]
+        # Drop any false sync word found inside the last kept frame. Valid frames
+        # almost never overlap, so only then compare them one at a time.
+        if len(starts) < 2 or np.all(np.diff(starts) >= FRAME_SIZE):
+            keep = np.ones(len(starts), dtype=bool)
+        else:
+            keep = np.zeros(len(starts), dtype=bool)
+            last = -FRAME_SIZE
+            for i, start in enumerate(starts):
+                if start - last >= FRAME_SIZE:
+                    keep[i] = True
+                    last = start
+        starts = starts[keep]
+        frames = candidates[valid][keep][:, 1:-1].astype(np.int32)
+
+        # Keep the bytes that might begin an incomplete frame for the next chunk
+        end = starts[-1] + FRAME_SIZE if len(starts) else 0
+        self.remainder = buf[max(end, len(buf) - FRAME_SIZE + 1):]
+        self.frames += frames.shape[0]
+        return frames
+
+def read_available(stream, chunk_size):
+    """
+    Read everything already waiting on a serial port, up to chunk_size bytes,
+    otherwise block for at least a byte. Reads a chunk from other streams.
+    """
+    waiting = getattr(stream, 'in_waiting', chunk_size)
+    return stream.read(min(max(waiting, 1), chunk_size))
+
+def _npy_header(shape, dtype, length):
+    # Header padded with spaces to a fixed length, so that it can be rewritten
+    # in place once the final shape is known
+    header = "{{'descr': '{}', 'fortran_order': False, 'shape': {}, }}".format(
+        np.dtype(dtype).str, shape)
+    header = header.ljust(length - 10 - 1) + '\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
+
+class BlockWriter:
+    """
+    Writes labelled frames to a data file in blocks of rows instead of one row
+    at a time. Files ending in .npy are written as binary int32 arrays, and any
+    other file is written as CSV.
+    """
+    HEADER_LENGTH = 128
+
+    def __init__(self, filename, label, block_rows=1024):
+        self.binary = path.splitext(filename)[1] == '.npy'
+        self.file = open(filename, 'wb')
+        self.label = label
+        self.block_rows = block_rows
+        self.blocks = []
+        self.pending = 0
+        self.rows = 0
+        if self.binary:
+            self.file.write(_npy_header((0, NUM_FEATURES + 1), np.int32, self.HEADER_LENGTH))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, frames):
+        if frames.shape[0] == 0:
+            return
+        self.blocks.append(frames)
+        self.pending += frames.shape[0]
+        if self.pending >= self.block_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.blocks:
+            return
+        frames = np.vstack(self.blocks)
+        block = np.c_[ frames, np.full(frames.shape[0], self.label) ].astype(np.int32)
+        if self.binary:
+            self.file.write(block.astype('<i4').tobytes())
+        else:
+            np.savetxt(self.file, block, fmt='%d', delimiter=',')
+        self.rows += block.shape[0]
+        self.blocks = []
+        self.pending = 0
+
+    def close(self):
+        self.flush()
+        if self.binary:
+            self.file.seek(0)
+            self.file.write(_npy_header((self.rows, NUM_FEATURES + 1), np.int32,
+                                        self.HEADER_LENGTH))
+        self.file.close()
+
+class SerialCollector:
+    """
+    Collects frames from a serial port. A reader thread does bulk reads into a
+    bounded queue of byte chunks, which are decoded and written in blocks.
+    Chunks that arrive while the queue is full are dropped and counted.
+    """
+    def __init__(self, stream, writer, parser=None, chunk_size=4096, queue_size=256):
+        self.stream = stream
+        self.writer = writer
+        self.chunk_size = chunk_size
+        self.chunks = queue.Queue(queue_size)
+        self.parser = parser or FrameParser()
+        self.dropped_chunks = 0
+        self.stopped = threading.Event()
+
+    def _read(self):
+        try:
+            while not self.stopped.is_set():
+                data = read_available(self.stream, self.chunk_size)
+                if not data:
+                    # End of a replayed file
+                    break
+                try:
+                    self.chunks.put_nowait(data)
+                except queue.Full:
+                    self.dropped_chunks += 1
+        except (OSError, ValueError):
+            # The stream was closed while reading
+            pass
+        finally:
+            self.chunks.put(None)
+
+    def run(self, duration):
+        """
+        Collect frames for duration seconds, or until the stream ends
+        """
+        reader = threading.Thread(target=self._read, daemon=True)
+        reader.start()
+        deadline = time.monotonic() + duration
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                data = self.chunks.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if data is None:
+                break
+            self.writer.write(self.parser.feed(data))
+        self.stopped.set()
+        self.writer.flush()
+
+    def counters(self):
+        return {
+            'frames': self.parser.frames,
+            'malformed': self.parser.malformed,
+            'dropped_chunks': self.dropped_chunks,
+        }
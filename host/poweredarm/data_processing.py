@@ -1,25 +1,177 @@
-import csv
-import time
-import serial
-from matplotlib import pyplot as plt
+import hashlib
+import json
+import os
+from os import path
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from poweredarm.collector import (BlockWriter, SerialCollector, FrameParser,
+                                  BinaryFrameParser, read_available)
+from poweredarm import profiling
 from poweredarm.util import NUM_FEATURES
 import numpy as np
 import platform
 
-def aggregate_csv(data_files):
+def _file_hash(fname):
+    sha = hashlib.sha1()
+    with open(fname, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 16), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def _compact(fdata):
+    # Recorded EMG data and labels are small integers, so they fit in int16
+    info = np.iinfo(np.int16)
+    if (np.all(fdata == np.round(fdata)) and
+            fdata.min(initial=0) >= info.min and fdata.max(initial=0) <= info.max):
+        return fdata.astype(np.int16)
+    return fdata
+
+def is_data_file(fname):
+    """
+    Whether a file holds labelled EMG data, either CSV or the .npy written by
+    BlockWriter, rather than something else such as collection timestamps
+    """
+    return fname.endswith('.csv') or (fname.endswith('.npy') and not fname.endswith('.times.npy'))
+
+def load_csv(fname, cache=True):
+    """
+    Load a CSV data file. The parsed data is cached in binary form inside a
+    .cache directory next to the file, and the cached array is memory-mapped.
+    A cache entry is reused while the file's size and mtime are unchanged, or
+    while its contents still have the same hash.
+
+    Files ending in .npy, as written by BlockWriter, are already binary, so
+    they're memory-mapped directly.
+    """
+    if fname.endswith('.npy'):
+        return np.load(fname, mmap_mode='r')
+    if not cache:
+        profiling.count('csv files parsed')
+        return np.loadtxt(fname, delimiter=',', dtype=np.float32, ndmin=2)
+
+    cache_dir = path.join(path.dirname(fname), '.cache')
+    cache_file = path.join(cache_dir, path.basename(fname) + '.npy')
+    meta_file = path.join(cache_dir, path.basename(fname) + '.json')
+    stat = os.stat(fname)
+    meta = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+    try:
+        with open(meta_file, 'r') as file:
+            cached_meta = json.load(file)
+        if all(cached_meta[key] == meta[key] for key in meta):
+            profiling.count('csv cache hits')
+            return np.load(cache_file, mmap_mode='r')
+        # The file might have only been touched, so compare its contents
+        meta['sha1'] = _file_hash(fname)
+        if cached_meta['sha1'] == meta['sha1']:
+            profiling.count('csv cache hits')
+            fdata = np.load(cache_file, mmap_mode='r')
+            _write_json(meta_file, meta)
+            return fdata
+    except (OSError, ValueError, KeyError):
+        # Missing or corrupted cache entry, so rebuild it
+        pass
+
+    profiling.count('csv files parsed')
+    fdata = _compact(np.loadtxt(fname, delimiter=',', dtype=np.float32, ndmin=2))
+    if 'sha1' not in meta:
+        meta['sha1'] = _file_hash(fname)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary file first, so a partial entry is never loaded
+    tmp_file = cache_file + '.tmp.npy'
+    np.save(tmp_file, fdata)
+    os.replace(tmp_file, cache_file)
+    _write_json(meta_file, meta)
+    return np.load(cache_file, mmap_mode='r')
+
+def _write_json(fname, obj):
+    tmp_file = fname + '.tmp'
+    with open(tmp_file, 'w') as file:
+        json.dump(obj, file)
+    os.replace(tmp_file, fname)
+
+@profiling.timed('aggregate_csv')
+def aggregate_csv(data_files, cache=True, shuffle=True, filename=None, transform=None,
+                  max_workers=1):
     """
     Load training data from a list of CSV files, concatenate them by the column,
-    and returns them after shuffling.
+    and returns them after shuffling. The output is allocated once and each
+    file is copied into it, loading from the binary cache if enabled.
+
+    If filename is given, the output is a memory-mapped .npy file at that path
+    instead of an in-memory array. Use shuffle=False with split_indices() to
+    avoid shuffling it row by row.
+
+    If transform is given, it is applied to the data of each file before
+    concatenating, such as FeatureExtractor.transform_data().
+
+    If max_workers isn't 1, the files are loaded by a pool of that many
+    threads, or one per CPU if None.
     """
-    data = np.array([])
+    if max_workers == 1 or len(data_files) <= 1:
+        fdatas = [load_csv(fname, cache) for fname in data_files]
+    else:
+        with ThreadPoolExecutor(max_workers) as pool:
+            fdatas = list(pool.map(lambda fname: load_csv(fname, cache), data_files))
+    if transform is not None:
+        fdatas = [transform(fdata) for fdata in fdatas]
+    if not fdatas:
+        return np.array([], dtype=np.float32)
 
-    for fname in data_files:
-        fdata = np.loadtxt(fname, delimiter=',', dtype=np.float32)
-        data = np.vstack([data, fdata]) if data.size else fdata
+    shape = (sum(fdata.shape[0] for fdata in fdatas), fdatas[0].shape[1])
+    if filename is None:
+        data = np.empty(shape, dtype=np.float32)
+    else:
+        data = np.lib.format.open_memmap(filename, mode='w+', dtype=np.float32, shape=shape)
+    pos = 0
+    for fdata in fdatas:
+        data[pos:pos + fdata.shape[0], :] = fdata
+        pos += fdata.shape[0]
 
-    np.random.shuffle(data)
+    profiling.count('rows loaded', shape[0])
+    if shuffle:
+        np.random.shuffle(data)
     return data
 
+def split_indices(labels, proportions, seed=None, stratify=False):
+    """
+    Split the row indices of a dataset into shuffled chunks according to a list
+    of proportions, like create_dataset() but without touching the data itself.
+    The last chunk is the portion of the data not covered by the proportions.
+
+    :param labels: m vector of class numbers, which is the last column of the data.
+    :param proportions: List of proportions, one for each chunk but the last.
+    :param seed: Seed of the shuffle, for reproducible splits.
+    :param stratify: Split each class separately, so that every chunk has the
+    same proportion of each class.
+    :returns: List of index arrays, one for each chunk.
+    """
+    rng = np.random.RandomState(seed)
+    if stratify:
+        groups = [np.flatnonzero(labels == cls) for cls in np.unique(labels)]
+    else:
+        groups = [np.arange(labels.shape[0])]
+
+    chunks = [[] for _ in range(len(proportions) + 1)]
+    for group in groups:
+        assert all(p < 1 for p in proportions)
+        ends = (np.cumsum(proportions) * group.shape[0]).astype(int)
+        for chunk, part in zip(chunks, np.split(rng.permutation(group), ends)):
+            chunk.append(part)
+    return [rng.permutation(np.concatenate(chunk)) for chunk in chunks]
+
+def gather_batches(data, indices, batch_size):
+    """
+    Lazily gather the rows of data at the given indices in batches of at most
+    batch_size rows, so that only one batch is held in memory at a time. Each
+    batch's indices are read in sorted order, which is faster on memory-mapped
+    data. Yields each pair of (X, y) sets.
+    """
+    for start in range(0, indices.shape[0], batch_size):
+        batch = np.asarray(data[np.sort(indices[start:start + batch_size]), :],
+                           dtype=np.float32)
+        yield batch[:, :-1], batch[:, -1]
+
 def create_dataset(data, proportions):
     """
     Split data into chunks according to a list of proportions. The last chunk is
@@ -46,37 +198,105 @@ def create_dataset(data, proportions):
     yield X
     yield y
 
-def graph_csv(filename):
-    fdata = np.loadtxt(filename, delimiter=',', dtype=np.float32)
-    fdata = fdata[:, :8]
-    plt.plot(np.arange(np.shape(fdata)[0]), fdata)
-    plt.title('EMG Data for {}'.format(filename))
-    plt.xlabel('Time')
-    plt.ylabel('Magnitude')
-    plt.show()
+def iter_csv_chunks(data_files, chunk_rows):
+    """
+    Stream training data from a list of CSV or .npy files in chunks of at most
+    chunk_rows rows, without loading whole files. Yields each pair of (X, y)
+    sets, in file order.
+    """
+    for fname in data_files:
+        if fname.endswith('.npy'):
+            data = load_csv(fname)
+            for start in range(0, data.shape[0], chunk_rows):
+                chunk = np.asarray(data[start:start + chunk_rows], dtype=np.float32)
+                yield chunk[:, :-1], chunk[:, -1]
+            continue
+        with open(fname, 'r') as file:
+            while True:
+                lines = list(islice(file, chunk_rows))
+                if not lines:
+                    break
+                chunk = np.loadtxt(lines, delimiter=',', dtype=np.float32, ndmin=2)
+                yield chunk[:, :-1], chunk[:, -1]
 
-def collect_from_serial(filename, label):
+def graph_csv(filename, chunk_rows=65536, show=True):
     """
-    Reads output data from USB serial port for some time and puts it
-    into CSV data file along with the supplied label. Used to create
-    labelled training data.
+    Graph the EMG channels of a CSV file over time. The file is read in
+    chunks and decimated to the width of the plot in pixels, keeping the
+    minimum and maximum of each pixel, so long recordings plot quickly.
+    """
+    # Imported here since matplotlib is slow to load and most commands don't plot
+    from matplotlib import pyplot as plt
+    from poweredarm.plotting import count_rows, minmax_envelope, plot_envelope
+    fig, ax = plt.subplots()
+    chunks = (X[:, :NUM_FEATURES] for X, _ in iter_csv_chunks([filename], chunk_rows))
+    plot_envelope(ax, *minmax_envelope(chunks, count_rows(filename), int(ax.bbox.width)),
+                  linewidth=0.5)
+    ax.set_title('EMG Data for {}'.format(filename))
+    ax.set_xlabel('Time')
+    ax.set_ylabel('Magnitude')
+    if show:
+        plt.show()
+    return fig
+
+def graph_relationships_csv(filename, max_points=20000, seed=None, chunk_rows=65536, show=True):
+    """
+    Graph the pairwise relationships between the EMG channels of a CSV file
+    as a single scatter matrix figure of a random sample of max_points rows,
+    read in chunks.
+    """
+    from matplotlib import pyplot as plt
+    from poweredarm.plotting import reservoir_sample, scatter_matrix
+    chunks = (X[:, :NUM_FEATURES] for X, _ in iter_csv_chunks([filename], chunk_rows))
+    sample = reservoir_sample(chunks, max_points, np.random.default_rng(seed))
+    fig = scatter_matrix(sample, title='Channels of {}'.format(filename))
+    if show:
+        plt.show()
+    return fig
+
+def default_port():
+    """
+    Serial port that the ESP32 is usually connected to
     """
     if platform.system() == 'Windows':
-        port = 'COM12'
-    else:
-        port = '/dev/ttyUSB0'
-
-    with serial.Serial(port, 115200, xonxoff=True) as ser:
-        with open(filename, 'w') as csvfile:
-            writer = csv.writer(csvfile)
-
-            timeout = time.time() + 15
-            while time.time() < timeout:
-                line = ser.readline().decode('utf-8')
-
-                if line.startswith("_DATA_"):
-                    data = line.split()[1:NUM_FEATURES + 1]
-                    # Type check the values
-                    data = [int(i) for i in data] + [label]
-                    print(data)
-                    writer.writerow(data)
+        return 'COM12'
+    return '/dev/ttyUSB0'
+
+def open_source(source, timeout=None, binary=False):
+    """
+    Open a source of EMG data lines, which is either a serial port or a
+    previously captured serial log file to replay. Reads from a serial port
+    give up after timeout seconds, or block if None. Set binary if the ESP32
+    sends binary frames.
+    """
+    if path.isfile(source):
+        return open(source, 'rb')
+    import serial
+    # Software flow control would swallow 0x11 and 0x13 bytes of binary frames
+    return serial.Serial(source, 115200, xonxoff=not binary, timeout=timeout)
+
+def read_samples(stream, binary=False):
+    """
+    Read the EMG samples sent by the ESP32 from a stream, such as a serial
+    port, as either _DATA_ text lines or binary frames. Yields the features of
+    each sample as an array of ints.
+    """
+    parser = BinaryFrameParser() if binary else FrameParser()
+    for data in iter(lambda: read_available(stream, 4096), b''):
+        yield from parser.feed(data)
+
+def collect_from_serial(filename, label, duration=15, source=None, binary=False):
+    """
+    Reads output data from USB serial port for some time and puts it
+    into a data file along with the supplied label. Used to create
+    labelled training data. The file is CSV unless it ends in .npy. Set binary
+    if the ESP32 sends binary frames instead of text lines.
+
+    :returns: Dict of counters of collected, malformed and dropped data.
+    """
+    with open_source(source or default_port(), binary=binary) as ser:
+        with BlockWriter(filename, label) as writer:
+            parser = BinaryFrameParser() if binary else FrameParser()
+            collector = SerialCollector(ser, writer, parser)
+            collector.run(duration)
+    return collector.counters()
@@ -0,0 +1,139 @@
+import json
+import os
+import re
+from datetime import datetime
+from os import path
+import numpy as np
+from poweredarm.data_processing import load_csv, is_data_file, _file_hash, _write_json
+from poweredarm.util import Gesture
+
+# Date and time in the names of collected files, such as grip-2019-05-26-11-48-56.csv
+_SESSION_PATTERN = re.compile(r'(\d{4})-(\d{2})-(\d{2})[-@_](\d{2})-(\d{2})-(\d{2})')
+
+def _session_time(fname, mtime):
+    match = _SESSION_PATTERN.search(path.basename(fname))
+    if match:
+        return datetime(*map(int, match.groups()))
+    # Fall back to when the file was last written
+    return datetime.fromtimestamp(mtime)
+
+def _parse_time(value):
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+class DatasetIndex:
+    """
+    Manifest of the data files in a directory, stored as index.json next to
+    them. Each file's entry records its gesture, session time, row count,
+    per-channel statistics and content hash, so that data can be selected and
+    its scaling computed without reading the rows. Entries are only recomputed
+    for files that changed.
+    """
+    FILENAME = 'index.json'
+    VERSION = 1
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.filename = path.join(directory, self.FILENAME)
+        try:
+            with open(self.filename, 'r') as file:
+                saved = json.load(file)
+            self.entries = saved['files'] if saved['version'] == self.VERSION else {}
+        except (OSError, ValueError, KeyError):
+            self.entries = {}
+
+    def add(self, fname):
+        """
+        Add or refresh the entry of a data file in the directory. Returns the entry.
+        """
+        name = path.basename(fname)
+        fname = path.join(self.directory, name)
+        stat = os.stat(fname)
+        entry = self.entries.get(name)
+        if entry is not None:
+            if entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+                return entry
+            # The file might have only been touched, so compare its contents
+            sha1 = _file_hash(fname)
+            if entry['sha1'] == sha1:
+                entry['mtime'] = stat.st_mtime_ns
+                return entry
+        else:
+            sha1 = _file_hash(fname)
+
+        data = load_csv(fname)
+        X = np.asarray(data[:, :-1], dtype=np.float64)
+        labels = np.unique(data[:, -1]).astype(int)
+        if len(labels) == 1 and labels[0] in [g.value for g in Gesture]:
+            gesture = Gesture(labels[0]).name
+        else:
+            gesture = None
+        self.entries[name] = entry = {
+            'gesture': gesture,
+            'labels': labels.tolist(),
+            'session': _session_time(name, stat.st_mtime).isoformat(),
+            'rows': X.shape[0],
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'sha1': sha1,
+            'sum': np.sum(X, 0).tolist(),
+            'sum_sq': np.sum(X * X, 0).tolist(),
+            'min': np.min(X, 0, initial=np.inf).tolist(),
+            'max': np.max(X, 0, initial=-np.inf).tolist(),
+        }
+        return entry
+
+    def update(self):
+        """
+        Add every data file in the directory and forget the deleted ones
+        """
+        names = sorted(name for name in os.listdir(self.directory) if is_data_file(name))
+        for name in names:
+            self.add(name)
+        self.entries = {name: self.entries[name] for name in names}
+        return self
+
+    def save(self):
+        _write_json(self.filename, {'version': self.VERSION, 'files': self.entries})
+
+    def select(self, gestures=None, after=None, before=None):
+        """
+        Paths of the data files matching a query, from oldest to newest session.
+
+        :param gestures: Names of the gestures to include. Includes all if None.
+        :param after: Only include sessions after this datetime or ISO date.
+        :param before: Only include sessions before this datetime or ISO date.
+        """
+        after = after and _parse_time(after)
+        before = before and _parse_time(before)
+        selected = []
+        for name, entry in self.entries.items():
+            session = datetime.fromisoformat(entry['session'])
+            if ((gestures is None or entry['gesture'] in gestures) and
+                    (after is None or session > after) and
+                    (before is None or session < before)):
+                selected.append((session, name))
+        return [path.join(self.directory, name) for _, name in sorted(selected)]
+
+    def scaling(self, files):
+        """
+        Feature scaling parameters of the data in the given files, the same as
+        LinearClassifier.fit_scaling() computes from the rows. Returns the
+        offset and divisor. These cover every row, so they shouldn't be used to
+        train a classifier that is then tested on some of the same rows.
+        """
+        entries = [self.entries[path.basename(fname)] for fname in files]
+        rows = sum(entry['rows'] for entry in entries)
+        offset = np.sum([entry['sum'] for entry in entries], 0) / rows
+        divisor = (np.max([entry['max'] for entry in entries], 0) -
+                   np.min([entry['min'] for entry in entries], 0))
+        return offset, divisor
+
+    def std(self, files):
+        """
+        Standard deviation of each channel of the data in the given files
+        """
+        entries = [self.entries[path.basename(fname)] for fname in files]
+        rows = sum(entry['rows'] for entry in entries)
+        mean = np.sum([entry['sum'] for entry in entries], 0) / rows
+        mean_sq = np.sum([entry['sum_sq'] for entry in entries], 0) / rows
+        return np.sqrt(np.maximum(mean_sq - mean * mean, 0))
@@ -0,0 +1,145 @@
+import numpy as np
+
+# Windowed time-domain EMG features, in the order they're output:
+# mav - mean absolute value
+# rms - root mean square
+# wl - waveform length, the sum of absolute differences between samples
+# ssc - slope sign changes, the number of samples that are local peaks or valleys
+KINDS = ('mav', 'rms', 'wl', 'ssc')
+
+def _window_sums(values, length):
+    """
+    Sum each run of length rows ending at every row from length-1 onwards,
+    using prefix sums instead of summing each window separately
+    """
+    prefix = np.zeros((values.shape[0] + 1, values.shape[1]))
+    np.cumsum(values, 0, out=prefix[1:, :])
+    return prefix[length:, :] - prefix[:-length, :]
+
+class FeatureExtractor:
+    """
+    Computes windowed features over each channel of the raw EMG samples. The
+    features of a window are output for every sample once window samples have
+    been seen, so m samples produce m-window+1 rows of features.
+    """
+    def __init__(self, window, kinds=KINDS):
+        assert window >= 3
+        assert all(kind in KINDS for kind in kinds)
+        self.window = window
+        # Keep the canonical order, so that the target computes the same layout
+        self.kinds = tuple(kind for kind in KINDS if kind in kinds)
+
+    def num_outputs(self, num_channels):
+        return num_channels * len(self.kinds)
+
+    def transform(self, X):
+        """
+        Compute the features of a m * n matrix of chronologically ordered
+        samples. Returns a m-window+1 * n*k matrix, where the columns are
+        grouped by kind of feature.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        W = self.window
+        if X.shape[0] < W:
+            return np.zeros((0, self.num_outputs(X.shape[1])), dtype=np.float32)
+
+        # diff(t) = x(t) - x(t-1), for t from 1
+        diff = np.diff(X, axis=0)
+        outputs = {}
+        if 'mav' in self.kinds:
+            outputs['mav'] = _window_sums(np.abs(X), W) / W
+        if 'rms' in self.kinds:
+            outputs['rms'] = np.sqrt(_window_sums(X * X, W) / W)
+        if 'wl' in self.kinds:
+            # The W-1 differences between the samples of each window
+            outputs['wl'] = _window_sums(np.abs(diff), W - 1)
+        if 'ssc' in self.kinds:
+            # Whether x(t) is a peak or valley, for t from 1 to m-2
+            change = (diff[:-1, :] * -diff[1:, :] > 0).astype(np.float64)
+            # The W-2 samples inside each window
+            outputs['ssc'] = _window_sums(change, W - 2)
+
+        return np.hstack([outputs[kind] for kind in self.kinds]).astype(np.float32)
+
+    def transform_data(self, data):
+        """
+        Transform a file's worth of data with the label in the last column.
+        Every window is labelled with the label of its last sample. Use as the
+        transform of aggregate_csv(), so windows never span multiple files.
+        """
+        data = np.asarray(data)
+        features = self.transform(data[:, :-1])
+        return np.c_[ features, data[self.window - 1:, -1] ]
+
+    def stream(self, num_channels):
+        """
+        Returns a StreamingFeatures that computes the same features one sample
+        at a time
+        """
+        return StreamingFeatures(self, num_channels)
+
+    def header_defines(self):
+        """
+        List of (name, value) C defines that configure the target's feature
+        extraction to match
+        """
+        defines = [('FEATURES_WINDOW', self.window)]
+        defines += [('FEATURES_' + kind.upper(), 1) for kind in self.kinds]
+        return defines
+
+class _RunningSum:
+    # Sum of the last length rows pushed, kept up to date in O(1) per row
+    def __init__(self, length, width):
+        self.values = np.zeros((length, width))
+        self.sum = np.zeros(width)
+        self.pos = 0
+
+    def push(self, value):
+        self.sum += value - self.values[self.pos, :]
+        self.values[self.pos, :] = value
+        self.pos = (self.pos + 1) % self.values.shape[0]
+
+class StreamingFeatures:
+    """
+    Incremental version of FeatureExtractor.transform() for live data, which
+    takes constant time and memory per sample using running sums.
+    """
+    def __init__(self, extractor, num_channels):
+        W = extractor.window
+        self.extractor = extractor
+        self.count = 0
+        self.prev = np.zeros(num_channels)
+        self.prev_diff = np.zeros(num_channels)
+        self.abs_sum = _RunningSum(W, num_channels)
+        self.sq_sum = _RunningSum(W, num_channels)
+        self.wl_sum = _RunningSum(W - 1, num_channels)
+        self.ssc_sum = _RunningSum(W - 2, num_channels)
+
+    def push(self, x):
+        """
+        Add a sample. Returns the features of the window ending at it, or None
+        until a whole window has been seen.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        self.abs_sum.push(np.abs(x))
+        self.sq_sum.push(x * x)
+        if self.count >= 1:
+            diff = x - self.prev
+            self.wl_sum.push(np.abs(diff))
+            if self.count >= 2:
+                # Whether the previous sample was a peak or valley
+                self.ssc_sum.push((self.prev_diff * -diff > 0).astype(np.float64))
+            self.prev_diff = diff
+        self.prev = x
+        self.count += 1
+
+        W = self.extractor.window
+        if self.count < W:
+            return None
+        outputs = {
+            'mav': self.abs_sum.sum / W,
+            'rms': np.sqrt(np.maximum(self.sq_sum.sum, 0) / W),
+            'wl': self.wl_sum.sum,
+            'ssc': self.ssc_sum.sum,
+        }
+        return np.concatenate([outputs[kind] for kind in self.extractor.kinds]).astype(np.float32)
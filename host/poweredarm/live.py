@@ -0,0 +1,113 @@
+import time
+import numpy as np
+
+class RingBuffer:
+    """
+    Fixed capacity FIFO queue of rows. Once full, pushing a row overwrites
+    the oldest one, which is counted as dropped.
+    """
+    def __init__(self, capacity, width, dtype=np.float32):
+        self.rows = np.zeros((capacity, width), dtype=dtype)
+        self.start = 0
+        self.size = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, row):
+        capacity = self.rows.shape[0]
+        self.rows[(self.start + self.size) % capacity, :] = row
+        if self.size == capacity:
+            self.start = (self.start + 1) % capacity
+            self.dropped += 1
+        else:
+            self.size += 1
+
+    def pop_all(self):
+        """
+        Remove all the rows, returning them in order as a size * width array
+        """
+        indices = (self.start + np.arange(self.size)) % self.rows.shape[0]
+        rows = self.rows[indices, :]
+        self.start = (self.start + self.size) % self.rows.shape[0]
+        self.size = 0
+        return rows
+
+class LatencyStats:
+    """
+    Tracks the latency of each sample, from when it was read to when its
+    prediction was made. Percentiles are computed over the most recent samples.
+    """
+    def __init__(self, history=4096):
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+        self.recent = RingBuffer(history, 1, dtype=np.float64)
+
+    def add(self, latencies):
+        self.count += len(latencies)
+        self.total += np.sum(latencies)
+        self.max = max(self.max, np.max(latencies, initial=0))
+        for latency in latencies[-self.recent.rows.shape[0]:]:
+            self.recent.push(latency)
+
+    def summary(self):
+        """
+        Returns a dict of latency statistics in milliseconds
+        """
+        recent = self.recent.rows[:len(self.recent), 0] * 1000
+        p50, p99 = np.percentile(recent, [50, 99]) if len(recent) else (0, 0)
+        return {
+            'samples': self.count,
+            'mean_ms': self.total / max(self.count, 1) * 1000,
+            'p50_ms': p50,
+            'p99_ms': p99,
+            'max_ms': self.max * 1000,
+        }
+
+    def __str__(self):
+        return ('{samples} samples, latency mean {mean_ms:.3f}ms, p50 {p50_ms:.3f}ms, ' +
+                'p99 {p99_ms:.3f}ms, max {max_ms:.3f}ms').format(**self.summary())
+
+def predict_live(classifier, samples, emit, window=8, capacity=1024):
+    """
+    Run a classifier on a live stream of samples. Samples are queued in a ring
+    buffer and predicted in one batch every window samples. Stops at the end
+    of the stream or on KeyboardInterrupt.
+
+    :param classifier: Trained LinearClassifier. If it was trained on windowed
+    features, they're computed from the samples as they arrive, and there's
+    no prediction until a whole window has been seen.
+    :param samples: Iterable of raw sample lists, such as read_samples().
+    :param emit: Function called with each batch of predicted classes.
+    :param window: Number of samples in each batch. Smaller windows have
+    lower latency, larger windows have less overhead per sample.
+    :param capacity: Capacity of the ring buffer.
+    :returns: LatencyStats of the predicted samples.
+    """
+    assert window <= capacity
+    pending = RingBuffer(capacity, classifier.num_features)
+    arrivals = RingBuffer(capacity, 1, dtype=np.float64)
+    stats = LatencyStats()
+
+    def flush():
+        predictions = classifier.predict(pending.pop_all())
+        stats.add(time.perf_counter() - arrivals.pop_all()[:, 0])
+        emit(predictions)
+
+    if classifier.features is not None:
+        stream = classifier.features.stream(classifier.num_features // len(classifier.features.kinds))
+        samples = (features for features in map(stream.push, samples) if features is not None)
+
+    try:
+        for sample in samples:
+            pending.push(sample)
+            arrivals.push(time.perf_counter())
+            if len(pending) >= window:
+                flush()
+    except KeyboardInterrupt:
+        pass
+    if len(pending):
+        flush()
+    return stats
@@ -0,0 +1,93 @@
+import numpy as np
+
+def confusion_matrix(y, predictions, num_classes):
+    """
+    Count how often each class is predicted as each other class, with a single
+    bincount over y * c + prediction.
+
+    :param y: m vector of class numbers.
+    :param predictions: m vector of predicted classes, or k * m matrix with the
+    predictions of k classifiers.
+    :param num_classes: Number of classes c.
+    :returns: c * c matrix where entry (i, j) is the number of samples of class
+    i predicted as class j, or a k * c * c stack of them.
+    """
+    predictions = np.asarray(predictions, dtype=np.intp)
+    codes = np.asarray(y, dtype=np.intp) * num_classes + predictions
+    if predictions.ndim == 1:
+        return np.bincount(codes, minlength=num_classes**2).reshape(num_classes, num_classes)
+
+    # Give each classifier its own range of codes, so one bincount covers them all
+    k = predictions.shape[0]
+    codes = codes + np.arange(k)[:, None] * num_classes**2
+    return np.bincount(codes.ravel(), minlength=k * num_classes**2).reshape(
+        k, num_classes, num_classes)
+
+def accuracy_recall(confusion):
+    """
+    Overall accuracy and the recall of each class from a confusion matrix, or
+    from a stack of them. Like LinearClassifier.evaluate(), the recall of a
+    class without any samples is -1.
+    """
+    correct = np.diagonal(confusion, axis1=-2, axis2=-1)
+    support = np.sum(confusion, -1)
+    recall = np.divide(correct, support, out=np.full(support.shape, -1.),
+                       where=support != 0)
+    accuracy = np.sum(correct, -1) / np.maximum(np.sum(support, -1), 1)
+    return accuracy, recall
+
+def _ratio(numerator, denominator):
+    # Undefined ratios are -1, like the recall of a class without any samples
+    return np.divide(numerator, denominator, out=np.full(np.shape(denominator), -1.),
+                     where=denominator != 0)
+
+def precision_recall_f1(confusion):
+    """
+    Precision, recall, F1 score and support of each class from a confusion
+    matrix, or from a stack of them. A precision or recall is -1 for a class
+    that is never predicted or has no samples, and so is its F1 score.
+    """
+    correct = np.diagonal(confusion, axis1=-2, axis2=-1).astype(np.float64)
+    support = np.sum(confusion, -1)
+    precision = _ratio(correct, np.sum(confusion, -2))
+    recall = _ratio(correct, support)
+    total = precision + recall
+    defined = (precision >= 0) & (recall >= 0)
+    f1 = np.full(precision.shape, -1.)
+    np.divide(2 * precision * recall, total, out=f1, where=defined & (total > 0))
+    # A class that is present and predicted, but never correctly
+    f1[defined & (total == 0)] = 0
+    return precision, recall, f1, support
+
+class ConfusionMatrix:
+    """
+    Confusion matrix that is accumulated chunk by chunk, so that evaluation
+    sets too big for memory can be scored without keeping every prediction.
+    """
+    def __init__(self, num_classes):
+        self.num_classes = num_classes
+        self.matrix = np.zeros((num_classes, num_classes), dtype=np.int64)
+
+    def update(self, y, predictions):
+        self.matrix += confusion_matrix(y, predictions, self.num_classes)
+        return self
+
+    def accuracy_recall(self):
+        return accuracy_recall(self.matrix)
+
+    def precision_recall_f1(self):
+        return precision_recall_f1(self.matrix)
+
+    def report(self):
+        """
+        Returns a table of the precision, recall, F1 score and support of each
+        class, followed by the overall accuracy
+        """
+        precision, recall, f1, support = self.precision_recall_f1()
+        lines = ['{:>5} {:>9} {:>9} {:>9} {:>9}'.format(
+            'Class', 'Precision', 'Recall', 'F1', 'Support')]
+        for cls in range(self.num_classes):
+            lines.append('{:5d} {:9.4f} {:9.4f} {:9.4f} {:9d}'.format(
+                cls, precision[cls], recall[cls], f1[cls], support[cls]))
+        lines.append('Accuracy: {:.4f}'.format(self.accuracy_recall()[0]))
+        return '\n'.join(lines)
@@ -0,0 +1,56 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+
+# Dataset shared with the worker processes, attached once per worker
+_shm = None
+_data = None
+
+def _attach(name, shape, dtype):
+    global _shm, _data
+    _shm = shared_memory.SharedMemory(name=name)
+    _data = np.ndarray(shape, dtype=dtype, buffer=_shm.buf)
+
+def _run(fn, args, seed):
+    return fn(_data, np.random.RandomState(seed), *args)
+
+def job_seeds(seed, num_jobs):
+    """
+    Derive a seed for each job from a single seed, so that every job gets its
+    own reproducible random stream no matter which worker runs it.
+    """
+    return np.random.RandomState(seed).randint(2**31 - 1, size=num_jobs)
+
+def run_parallel(fn, data, jobs, seed=None, max_workers=None):
+    """
+    Run fn(data, rng, *args) for each tuple of args in jobs across a process
+    pool. The data array is copied once into shared memory instead of being
+    pickled for every job, and rng is a RandomState seeded per job.
+
+    :param fn: Module level function, so that it can be sent to the workers.
+    :param data: Array shared read-only with every job.
+    :param jobs: List of argument tuples, one for each job.
+    :param seed: Seed used to derive the per-job seeds.
+    :param max_workers: Size of the pool. Defaults to the number of CPUs.
+    :returns: List of results in the same order as jobs.
+    """
+    seeds = job_seeds(seed, len(jobs))
+
+    # Not worth starting a pool, but keep the same seeds for reproducibility
+    if len(jobs) <= 1 or max_workers == 1:
+        return [fn(data, np.random.RandomState(s), *args)
+                for args, s in zip(jobs, seeds)]
+
+    shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+    try:
+        shared = np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)
+        shared[...] = data
+        del shared
+
+        with ProcessPoolExecutor(max_workers, initializer=_attach,
+                                 initargs=(shm.name, data.shape, data.dtype.str)) as pool:
+            futures = [pool.submit(_run, fn, args, s) for args, s in zip(jobs, seeds)]
+            return [future.result() for future in futures]
+    finally:
+        shm.close()
+        shm.unlink()
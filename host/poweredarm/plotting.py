@@ -0,0 +1,120 @@
+import numpy as np
+
+def count_rows(fname):
+    """
+    Count the rows of a data file without parsing them
+    """
+    if fname.endswith('.npy'):
+        return np.load(fname, mmap_mode='r').shape[0]
+    rows = 0
+    last = b'\n'
+    with open(fname, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            rows += block.count(b'\n')
+            last = block[-1:]
+    # The last line might not end in a newline
+    return rows + (last != b'\n')
+
+def minmax_envelope(chunks, num_rows, width):
+    """
+    Decimate a time series to about width buckets, keeping the minimum and
+    maximum of each channel in every bucket so that no peaks are lost.
+
+    :param chunks: Iterable of consecutive arrays of samples, with a column
+    for each channel.
+    :param num_rows: Number of samples in total, which sets the bucket size.
+    It only needs to be approximate.
+    :param width: Number of buckets, such as the width of the plot in pixels.
+    :returns: The index of the first sample of each bucket, and the minimum
+    and maximum of each bucket and channel.
+    """
+    bucket = max(1, -(-num_rows // max(1, width)))
+    lowers, uppers = [], []
+    pending = None
+    for chunk in chunks:
+        if pending is not None and pending.shape[0]:
+            chunk = np.concatenate([pending, chunk])
+        full = chunk.shape[0] // bucket * bucket
+        blocks = chunk[:full].reshape(-1, bucket, chunk.shape[1])
+        lowers.append(blocks.min(1))
+        uppers.append(blocks.max(1))
+        # Samples left over start the next chunk's first bucket
+        pending = chunk[full:]
+    if pending is not None and pending.shape[0]:
+        lowers.append(pending.min(0, keepdims=True))
+        uppers.append(pending.max(0, keepdims=True))
+    if not lowers:
+        return np.zeros(0, dtype=int), np.zeros((0, 0)), np.zeros((0, 0))
+    lower = np.concatenate(lowers)
+    upper = np.concatenate(uppers)
+    return np.arange(lower.shape[0]) * bucket, lower, upper
+
+def plot_envelope(ax, x, lower, upper, **kwargs):
+    """
+    Plot a decimated time series from minmax_envelope() as one line per
+    channel, which goes down to the minimum and up to the maximum at every
+    bucket, so that it looks the same as plotting every sample.
+    """
+    xs = np.repeat(x, 2)
+    ys = np.empty((2 * lower.shape[0], lower.shape[1]), dtype=lower.dtype)
+    ys[0::2] = lower
+    ys[1::2] = upper
+    return ax.plot(xs, ys, **kwargs)
+
+def reservoir_sample(chunks, size, rng):
+    """
+    Uniform random sample of at most size rows out of a stream of chunks of
+    rows, without knowing how many there are in advance
+    """
+    sample = None
+    seen = 0
+    for chunk in chunks:
+        if sample is None:
+            sample = np.empty((size, chunk.shape[1]), dtype=chunk.dtype)
+        # Fill the sample with the first rows
+        fill = min(size - min(seen, size), chunk.shape[0])
+        sample[seen:seen + fill] = chunk[:fill]
+        # Then each later row replaces a random one with probability size / (its index + 1)
+        indices = rng.integers(0, np.arange(seen + fill, seen + chunk.shape[0]) + 1)
+        replace = indices < size
+        sample[indices[replace]] = chunk[fill:][replace]
+        seen += chunk.shape[0]
+    if sample is None:
+        return np.zeros((0, 0))
+    return sample[:min(seen, size)]
+
+def scatter_matrix(X, bins=50, title=None):
+    """
+    Figure of the pairwise relationships between the channels of X, with a
+    2D histogram of every pair below the diagonal and a histogram of each
+    channel on it. Subsample X first, such as with reservoir_sample(), when
+    it is large.
+    """
+    # Imported here since matplotlib is slow to load and most commands don't plot
+    from matplotlib import pyplot as plt
+    num_channels = X.shape[1]
+    fig, axes = plt.subplots(num_channels, num_channels, squeeze=False,
+                             figsize=(1.5 * num_channels, 1.5 * num_channels))
+    ranges = [(X[:, i].min(initial=0), X[:, i].max(initial=1)) for i in range(num_channels)]
+    for i in range(num_channels):
+        for j in range(num_channels):
+            ax = axes[i, j]
+            if j > i:
+                ax.set_axis_off()
+                continue
+            if i == j:
+                ax.hist(X[:, i], bins, range=ranges[i])
+            else:
+                counts, _, _ = np.histogram2d(X[:, i], X[:, j], bins, range=[ranges[i], ranges[j]])
+                # A log scale keeps sparse outliers visible next to dense clusters
+                ax.imshow(np.log1p(counts), origin='lower', aspect='auto', cmap='viridis',
+                          extent=(ranges[j][0], ranges[j][1], ranges[i][0], ranges[i][1]))
+            ax.set_xticks([])
+            ax.set_yticks([])
+            if i == num_channels - 1:
+                ax.set_xlabel(str(j))
+            if j == 0:
+                ax.set_ylabel(str(i))
+    if title is not None:
+        fig.suptitle(title)
+    return fig
@@ -0,0 +1,162 @@
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# The active Profiler, or None when profiling is disabled. Hooks check this
+# before doing any work, so they cost next to nothing while disabled. Every
+# command imports this module, so the profilers are only imported when used.
+_profiler = None
+
+class Profiler:
+    """
+    Collects the time spent in each phase of a command, along with counters,
+    and optionally a cProfile and tracemalloc capture
+    """
+    def __init__(self, every=100, use_cprofile=False, use_tracemalloc=False):
+        # Number of gradient iterations timed together
+        self.every = every
+        # phase name -> [number of calls, total seconds]
+        self.phases = {}
+        self.counters = {}
+        self.cprofile = None
+        if use_cprofile:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+        self.use_tracemalloc = use_tracemalloc
+        self.peak_memory = None
+        self._lap = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.use_tracemalloc:
+            import tracemalloc
+            tracemalloc.start()
+        if self.cprofile is not None:
+            self.cprofile.enable()
+
+    def stop(self):
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        if self.use_tracemalloc:
+            import tracemalloc
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.total = time.perf_counter() - self.started
+
+    def add(self, name, seconds, calls=1):
+        phase = self.phases.setdefault(name, [0, 0.])
+        phase[0] += calls
+        phase[1] += seconds
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def lap(self, name, calls):
+        """
+        Attribute the time since the previous lap to a phase, such as a
+        block of iterations of a loop. The first lap only starts the clock.
+        """
+        now = time.perf_counter()
+        if self._lap is not None:
+            self.add(name, now - self._lap, calls)
+        self._lap = now
+
+    def reset_lap(self):
+        self._lap = None
+
+    def to_dict(self):
+        return {
+            'total_seconds': self.total,
+            'phases': {name: {'calls': calls, 'seconds': seconds}
+                       for name, (calls, seconds) in self.phases.items()},
+            'counters': dict(self.counters),
+            'peak_memory_bytes': self.peak_memory,
+        }
+
+    def summary(self):
+        """
+        Returns a table of the phases sorted by time, followed by the counters
+        and the cProfile and tracemalloc results if enabled
+        """
+        lines = ['{:40} {:>8} {:>12} {:>7}'.format('Phase', 'Calls', 'Seconds', '%')]
+        for name, (calls, seconds) in sorted(self.phases.items(), key=lambda p: -p[1][1]):
+            lines.append('{:40} {:8d} {:12.6f} {:7.1f}'.format(
+                name, calls, seconds, 100 * seconds / max(self.total, 1e-12)))
+        lines.append('{:40} {:>8} {:12.6f}'.format('total', '', self.total))
+
+        for name, value in sorted(self.counters.items()):
+            lines.append('{}: {}'.format(name, value))
+        if self.peak_memory is not None:
+            lines.append('Peak traced memory: {:.1f} KiB'.format(self.peak_memory / 1024))
+        if self.cprofile is not None:
+            import io
+            import pstats
+            stream = io.StringIO()
+            pstats.Stats(self.cprofile, stream=stream).sort_stats('cumulative').print_stats(15)
+            lines.append(stream.getvalue())
+        return '\n'.join(lines)
+
+    def save(self, filename):
+        import json
+        with open(filename, 'w') as file:
+            json.dump(self.to_dict(), file, indent=2, sort_keys=True)
+
+def active():
+    """
+    Returns the active Profiler, or None if profiling is disabled
+    """
+    return _profiler
+
+def enable(profiler):
+    global _profiler
+    _profiler = profiler
+    profiler.start()
+
+def disable():
+    global _profiler
+    if _profiler is not None:
+        _profiler.stop()
+    _profiler = None
+
+@contextmanager
+def _timed_phase(profiler, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.add(name, time.perf_counter() - start)
+
+class _NullPhase:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *args):
+        return False
+
+_NULL_PHASE = _NullPhase()
+
+def phase(name):
+    """
+    Context manager that times a block of code as the given phase
+    """
+    if _profiler is None:
+        return _NULL_PHASE
+    return _timed_phase(_profiler, name)
+
+def count(name, n=1):
+    if _profiler is not None:
+        _profiler.count(name, n)
+
+def timed(name):
+    """
+    Decorator that times every call of a function as the given phase
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return fn(*args, **kwargs)
+            with _timed_phase(_profiler, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
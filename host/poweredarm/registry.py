@@ -0,0 +1,110 @@
+import glob
+import hashlib
+import json
+import os
+import time
+from os import path
+from poweredarm.classifier import LinearClassifier
+from poweredarm.data_processing import _file_hash, _write_json
+
+class ModelRegistry:
+    """
+    Cache of trained classifiers in a directory, keyed by a hash of the
+    training data's contents and the training parameters, so that training
+    the same configuration on the same data again can reuse the saved model.
+
+    Each model is saved as lin-cls-<accuracy>-<key>.npz with a .json sidecar
+    of metadata, such as the dataset hash, accuracy, recalls and training
+    time. Once there are more than max_models cached models, or they take more
+    than max_bytes, the least recently used ones are deleted. Classifiers in
+    the directory without a sidecar were not made by the registry and are
+    never deleted.
+    """
+    # Bump to invalidate every cached model when training changes
+    VERSION = 1
+    KEY_LENGTH = 16
+
+    def __init__(self, directory, max_models=100, max_bytes=None):
+        self.directory = directory
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+
+    def dataset_hash(self, data_files):
+        """
+        Hash of the contents of the data files, in order, since the order
+        decides which rows end up in the training split
+        """
+        sha = hashlib.sha1()
+        for fname in data_files:
+            sha.update(_file_hash(fname).encode('ascii'))
+        return sha.hexdigest()
+
+    def key(self, dataset_hash, params):
+        """
+        Cache key of a model trained on a dataset with a dict of parameters,
+        which must be JSON serializable and include the seed of the split
+        """
+        blob = json.dumps({'version': self.VERSION, 'dataset': dataset_hash, 'params': params},
+                          sort_keys=True)
+        return hashlib.sha1(blob.encode('utf-8')).hexdigest()[:self.KEY_LENGTH]
+
+    def _models(self, pattern='*'):
+        # (model file, sidecar file) of every model made by the registry
+        sidecars = glob.glob(path.join(glob.escape(self.directory), 'lin-cls-{}.json'.format(pattern)))
+        return [(path.splitext(sidecar)[0] + '.npz', sidecar) for sidecar in sidecars
+                if path.isfile(path.splitext(sidecar)[0] + '.npz')]
+
+    def get(self, key):
+        """
+        Returns the cached (classifier, metadata, filename) for a key, or None
+        """
+        for model_file, sidecar in self._models('*-' + key):
+            try:
+                with open(sidecar, 'r') as file:
+                    metadata = json.load(file)
+                classifier = LinearClassifier.load(model_file)
+            except (OSError, ValueError, KeyError):
+                continue
+            if metadata.get('key') != key:
+                continue
+            metadata['last_used'] = time.time()
+            _write_json(sidecar, metadata)
+            return classifier, metadata, model_file
+        return None
+
+    def put(self, key, classifier, metadata):
+        """
+        Save a classifier under a key with its metadata, which should include
+        its 'accuracy', then evict old models. Returns the model's filename.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        stem = path.join(self.directory, 'lin-cls-{:.5g}-{}'.format(
+            metadata['accuracy'] * 100, key))
+        classifier.save(stem + '.npz')
+        metadata = dict(metadata, key=key, created=time.time(), last_used=time.time())
+        _write_json(stem + '.json', metadata)
+        self.evict()
+        return stem + '.npz'
+
+    def evict(self):
+        """
+        Delete the least recently used models until there are at most
+        max_models taking at most max_bytes
+        """
+        models = []
+        for model_file, sidecar in self._models():
+            try:
+                with open(sidecar, 'r') as file:
+                    last_used = json.load(file)['last_used']
+                size = os.path.getsize(model_file) + os.path.getsize(sidecar)
+            except (OSError, ValueError, KeyError):
+                continue
+            models.append((last_used, size, model_file, sidecar))
+        models.sort(reverse=True)
+
+        total = 0
+        for count, (_, size, model_file, sidecar) in enumerate(models, 1):
+            total += size
+            if count > self.max_models or (self.max_bytes is not None and total > self.max_bytes):
+                os.remove(model_file)
+                os.remove(sidecar)
@@ -0,0 +1,104 @@
+import numpy as np
+
+class PredictionSmoother:
+    """
+    Smooths a stream of predicted classes, so that noisy samples don't make
+    the arm jitter between gestures. The output only switches to another
+    class once at least min_votes of the last window predictions agree on it,
+    and otherwise holds the previous output. Since min_votes is more than
+    half the window, the vote share is a confidence threshold with
+    hysteresis: a class needs a clear majority to take over, but keeps the
+    output until another class has one.
+
+    Takes constant time and memory per sample using a ring buffer of the
+    last window predictions and running counts of each class. Matches
+    smoothing_push() on the target.
+    """
+    def __init__(self, num_classes, window=8, min_votes=None, initial=0):
+        self.window = window
+        self.min_votes = window // 2 + 1 if min_votes is None else min_votes
+        assert window // 2 < self.min_votes <= window
+        self.recent = np.full(window, -1, dtype=np.int64)
+        self.counts = np.zeros(num_classes, dtype=np.int64)
+        self.pos = 0
+        self.current = initial
+
+    def push(self, prediction):
+        """
+        Add the next prediction. Returns the smoothed class.
+        """
+        oldest = self.recent[self.pos]
+        if oldest >= 0:
+            self.counts[oldest] -= 1
+        self.recent[self.pos] = prediction
+        self.counts[prediction] += 1
+        self.pos = (self.pos + 1) % self.window
+        if self.counts[prediction] >= self.min_votes:
+            # Only the newest prediction's count went up, so only it can
+            # have just reached the threshold
+            self.current = int(prediction)
+        return self.current
+
+    def push_many(self, predictions):
+        return np.array([self.push(prediction) for prediction in predictions], dtype=np.int64)
+
+    def header_defines(self):
+        """
+        List of (name, value) C defines that configure the target's smoothing
+        to match
+        """
+        return [('SMOOTHING_WINDOW', self.window), ('SMOOTHING_MIN_VOTES', self.min_votes)]
+
+def smooth_predictions(predictions, num_classes, window=8, min_votes=None, initial=0):
+    """
+    Vectorized version of PredictionSmoother for recorded predictions, which
+    gives the same output as pushing them one at a time into a new smoother.
+    """
+    smoother = PredictionSmoother(num_classes, window, min_votes, initial)
+    predictions = np.asarray(predictions, dtype=np.int64)
+    # Counts of each class in the window ending at every sample
+    onehot = np.zeros((predictions.shape[0] + 1, num_classes), dtype=np.int32)
+    onehot[np.arange(1, predictions.shape[0] + 1), predictions] = 1
+    cumulative = np.cumsum(onehot, 0)
+    ends = np.arange(1, predictions.shape[0] + 1)
+    counts = cumulative[ends] - cumulative[np.maximum(ends - window, 0)]
+    # At most one class can have a majority, and the output switches to it
+    # there and holds until the next sample where some class has one
+    best = np.argmax(counts, 1)
+    decided = counts[np.arange(predictions.shape[0]), best] >= smoother.min_votes
+    last = np.maximum.accumulate(np.where(decided, np.arange(predictions.shape[0]), -1))
+    return np.where(last >= 0, best[last], initial)
+
+def decision_latencies(y, smoothed):
+    """
+    Number of samples it takes the smoothed output to reach the true class
+    after each change of it. Changes where it never does before the next one
+    have a latency of -1.
+    """
+    y = np.asarray(y)
+    changes = np.flatnonzero(y[1:] != y[:-1]) + 1
+    ends = np.append(changes[1:], y.shape[0])
+    latencies = []
+    for start, end in zip(changes, ends):
+        reached = np.flatnonzero(smoothed[start:end] == y[start])
+        latencies.append(reached[0] if reached.shape[0] else -1)
+    return np.array(latencies, dtype=np.int64)
+
+def smoothing_stats(y, predictions, num_classes, window, min_votes=None):
+    """
+    Accuracy, jitter and latency of smoothing recorded predictions with the
+    true classes y, which should change between sessions of each gesture.
+    Returns a dict of statistics, with latencies in samples.
+    """
+    smoothed = smooth_predictions(predictions, num_classes, window, min_votes, initial=y[0])
+    latencies = decision_latencies(y, smoothed)
+    reached = latencies[latencies >= 0]
+    return {
+        'window': window,
+        'min_votes': window // 2 + 1 if min_votes is None else min_votes,
+        'accuracy': np.mean(smoothed == y),
+        'switches_per_1000': np.count_nonzero(smoothed[1:] != smoothed[:-1]) * 1000 / len(y),
+        'mean_latency': np.mean(reached) if reached.shape[0] else np.nan,
+        'max_latency': np.max(reached, initial=0),
+        'missed': np.count_nonzero(latencies < 0),
+    }
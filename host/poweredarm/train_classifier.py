@@ -1,61 +1,307 @@
+import inspect
+import tempfile
+import time
 from os import path
 from datetime import datetime
 import numpy as np
-from matplotlib import pyplot as plt
-from poweredarm.classifier import LinearClassifier
-from poweredarm.data_processing import (aggregate_csv, create_dataset)
+from poweredarm import profiling
+from poweredarm.classifier import (LinearClassifier, RunningScaler, time_decay, predict_many,
+                                   OPTIMIZERS)
+from poweredarm.data_processing import (aggregate_csv, create_dataset,
+                                        split_indices, gather_batches, iter_csv_chunks,
+                                        load_csv)
+from poweredarm.metrics import confusion_matrix, accuracy_recall
+from poweredarm.parallel import run_parallel
+from poweredarm.smoothing import smoothing_stats
 from poweredarm.util import dated_name, NUM_CLASSES, NUM_FEATURES
 
-def visualize_relationships(X):
-    for i in range(8):
-        for j in range(i+1, 8):
-            plt.plot(X[:, i], X[:, j], 'b.')
-            plt.title('{} vs {}'.format(i, j))
-            plt.show()
+def visualize_relationships(X, max_points=20000, seed=None):
+    """
+    Show the pairwise relationships between the features of X in one scatter
+    matrix figure, of a random sample of at most max_points rows
+    """
+    from matplotlib import pyplot as plt
+    from poweredarm.plotting import scatter_matrix
+    if X.shape[0] > max_points:
+        X = X[np.random.default_rng(seed).choice(X.shape[0], max_points, replace=False)]
+    scatter_matrix(X)
+    plt.show()
 
-def evaluate_linear_classifier(classifier_file, data_files):
+def evaluate_linear_classifier(classifier_file, data_files, chunk_rows=65536):
+    """
+    Evaluate a saved classifier on the data, predicting chunk_rows samples at a
+    time. Classifiers trained on windowed features are evaluated on the same
+    features of the data. Returns the ConfusionMatrix of its predictions.
+    """
     classifier = LinearClassifier.load(classifier_file)
-    data = aggregate_csv(data_files)
+    transform = classifier.features and classifier.features.transform_data
+    data = aggregate_csv(data_files, shuffle=False, transform=transform)
+    return classifier.confusion(gather_batches(data, np.arange(data.shape[0]), chunk_rows))
+
+def evaluate_classifiers(classifier_files, data_files, max_workers=None):
+    """
+    Evaluate many classifiers on the same data, which is only loaded once and
+    scored by all the classifiers together.
+
+    Classifiers trained on windowed features, or that expect a different
+    number of features than the data has or a different number of classes
+    than the first classifier, are skipped.
+
+    :param max_workers: Number of threads loading the data files. Defaults to
+    the number of CPUs.
+    :returns: List of dicts with the 'classifier' file, 'accuracy', class
+    'recalls' and 'confusion' matrix of each classifier, from most to least
+    accurate, and the list of skipped classifier files.
+    """
+    data = aggregate_csv(data_files, shuffle=False, max_workers=max_workers)
     X, y = create_dataset(data, [])
-    #visualize_relationships(X)
 
-    acc, recalls = classifier.evaluate(X, y)
-    return acc, recalls
+    files, classifiers, skipped = [], [], []
+    for fname in classifier_files:
+        classifier = LinearClassifier.load(fname)
+        if (classifier.features is not None or classifier.num_features != X.shape[1] or
+                classifier.num_classes != (classifiers or [classifier])[0].num_classes):
+            skipped.append(fname)
+        else:
+            files.append(fname)
+            classifiers.append(classifier)
+    if not classifiers:
+        return [], skipped
+
+    predictions = predict_many(classifiers, X)
+    # confusion -> k * c * c
+    confusion = confusion_matrix(y, predictions, classifiers[0].num_classes)
+    accs, recalls = accuracy_recall(confusion)
+
+    results = [{'classifier': fname, 'accuracy': acc, 'recalls': recall, 'confusion': matrix}
+               for fname, acc, recall, matrix in zip(files, accs, recalls, confusion)]
+    results.sort(key=lambda result: -result['accuracy'])
+    return results, skipped
+
+def evaluate_smoothing(classifier_file, data_files, windows, min_share=None, chunk_rows=65536):
+    """
+    Compare the decision latency and accuracy of smoothing a classifier's
+    predictions with different window sizes. The files are read in chunks in
+    the given order, as a recording where the gesture changes between each
+    session, so the files should be in chronological order or alternate
+    between gestures.
+
+    :param windows: List of window sizes to try.
+    :param min_share: Share of the window that must agree to switch class.
+    Defaults to a simple majority.
+    :returns: List of dicts of smoothing_stats() for each window size.
+    """
+    classifier = LinearClassifier.load(classifier_file)
+    if classifier.features is None:
+        chunks = iter_csv_chunks(data_files, chunk_rows)
+    else:
+        # Windows can't span chunks, so transform each whole file
+        chunks = ((data[:, :-1], data[:, -1]) for data in
+                  (classifier.features.transform_data(load_csv(fname)) for fname in data_files))
+    predictions, labels = [], []
+    for X, y in chunks:
+        predictions.append(classifier.predict(X))
+        labels.append(y.astype(np.int64))
+    predictions, labels = np.concatenate(predictions), np.concatenate(labels)
+
+    results = []
+    for window in windows:
+        min_votes = None
+        if min_share is not None:
+            min_votes = min(max(window // 2 + 1, int(np.ceil(min_share * window))), window)
+        results.append(smoothing_stats(labels, predictions, classifier.num_classes,
+                                       window, min_votes))
+    return results
+
+def geometric_sizes(start, stop, num):
+    """
+    Schedule of roughly geometrically spaced training set sizes from start to
+    stop inclusive. Duplicates caused by rounding are dropped.
+    """
+    return np.unique(np.geomspace(start, stop, num).astype(int))
+
+def learning_curve(X, y, Xtest, ytest, sizes, **optimization_args):
+    """
+    Train a classifier on growing prefixes of (X, y) whose lengths are given by
+    sizes, which must be increasing. Each point warm-starts from the weights of
+    the previous point and the scaling parameters are updated with running sums.
+
+    Returns a k * 2 array of training and test accuracy for each of the k sizes.
+    """
+    sizes = np.asarray(sizes)
+    classifier = LinearClassifier(num_classes=NUM_CLASSES, num_features=NUM_FEATURES)
+    scaler = RunningScaler(NUM_FEATURES)
+    # k * n+1 * c stack of the weights trained for each size, folded with
+    # their scaling parameters so they can be applied to raw features
+    weights = np.empty((len(sizes), NUM_FEATURES + 1, NUM_CLASSES))
+
+    prev = 0
+    for k, size in enumerate(sizes):
+        scaler.update(X[prev:size, :])
+        prev = size
+        classifier.offset, classifier.divisor = scaler.offset, scaler.divisor
+        classifier.train(X[:size, :], y[:size], rescale=False, **optimization_args)
+        weights[k] = classifier.folded_weight()
+
+    def batch_correct(X, y):
+        # Score every size's weights at once, producing k * m predictions
+        scores = np.c_[ np.ones(X.shape[0]), X ] @ weights
+        return np.argmax(scores, 2) == y[None, :]
 
-def plot_learning_curves(data_files):
-    data = aggregate_csv(data_files)
-    # 80-20 data split
-    X, y, Xtest, ytest = create_dataset(data, [0.8])
+    acc_test = np.mean(batch_correct(Xtest, ytest), 1)
+    # Each size is evaluated on its own training prefix, so count the correct
+    # predictions cumulatively over the largest prefix
+    correct = np.cumsum(batch_correct(X[:sizes[-1], :], y[:sizes[-1]]), 1)
+    acc_train = correct[np.arange(len(sizes)), sizes - 1] / sizes
+    return np.c_[ acc_train, acc_test ]
 
+def _shuffled_split(data, rng):
+    # 80-20 data split of a shuffled copy, leaving the shared data untouched
+    return create_dataset(data[rng.permutation(data.shape[0]), :], [0.8])
+
+def _curve_job(data, rng, sizes):
+    X, y, Xtest, ytest = _shuffled_split(data, rng)
+    return learning_curve(X, y, Xtest, ytest, sizes, rate=0.001, num_iter=100, cost_every=0)
+
+def _train_job(data, rng):
+    X, y, Xtest, ytest = _shuffled_split(data, rng)
     classifier = LinearClassifier(num_classes=NUM_CLASSES, num_features=NUM_FEATURES)
+    classifier.train(X, y, optimizer='newton')
+    return classifier.evaluate(Xtest, ytest)
+
+def repeat_training(data_files, runs, seed=None, max_workers=None):
+    """
+    Train and evaluate a classifier on several different 80-20 splits of the
+    data in parallel. Returns a list of (accuracy, recalls) for each run.
+    """
+    # Each job shuffles its own copy, so the seed alone decides the splits
+    data = aggregate_csv(data_files, shuffle=False)
+    return run_parallel(_train_job, data, [()] * runs, seed, max_workers)
+
+def plot_learning_curves(data_files, sizes=None, repeats=1, seed=None, max_workers=None):
+    """
+    Plot the learning curve averaged over several different 80-20 splits of
+    the data, which are computed in parallel.
+    """
+    from matplotlib import pyplot as plt
+    data = aggregate_csv(data_files, shuffle=False)
+
+    if sizes is None:
+        sizes = geometric_sizes(6, min(2000, int(0.8 * data.shape[0])), 50)
+    accs = run_parallel(_curve_job, data, [(sizes,)] * repeats, seed, max_workers)
+    accs = np.mean(accs, 0)
 
-    accs = []
-    for i in range(5, 2000):
-        print("Learning curve data point {}".format(i))
-        Xtrain = X[:i+1, :]
-        ytrain = y[:i+1]
-        classifier.train(Xtrain, ytrain, rate=0.001, num_iter=100)
-        acc_train, _ = classifier.evaluate(Xtrain, ytrain)
-        acc_test, _ = classifier.evaluate(Xtest, ytest)
-        accs.append([acc_train, acc_test])
-
-    plt.plot(np.arange(len(accs)), np.array(accs))
+    plt.plot(sizes, accs)
     plt.title('Learning curve')
     plt.xlabel('Size of training set')
     plt.ylabel('Accuracy')
     plt.legend(['Training set', 'Test set'])
     plt.show()
 
-def train_linear_classifier(data_files, save=False, show_graphs=False):
-    data = aggregate_csv(data_files)
-    # 80-20 data split
-    X, y, Xtest, ytest = create_dataset(data, [0.8])
+@profiling.timed('train_minibatch')
+def _train_in_batches(classifier, data, train_idx, test_idx, batch_size, seed, rescale,
+                      num_epochs, rate, decay):
+    # Only one chunk of the memory-mapped data is gathered into memory at a time
+    chunk_rows = max(batch_size, 8192)
+    rng = np.random.RandomState(seed)
+    costs = classifier.train_minibatch(
+        lambda: gather_batches(data, rng.permutation(train_idx), chunk_rows),
+        batch_size=batch_size, num_epochs=num_epochs, schedule=time_decay(rate, decay),
+        rng=rng, rescale=rescale)
 
-    classifier = LinearClassifier(num_classes=NUM_CLASSES, num_features=NUM_FEATURES)
+    confusion = classifier.confusion(gather_batches(data, test_idx, chunk_rows))
+    return costs, confusion.accuracy_recall()
+
+def _optimizer_config(optimizer, optimizer_args):
+    # Every argument of the optimizer, including its defaults, so that changing
+    # a default also changes the registry key
+    params = inspect.signature(OPTIMIZERS[optimizer]).parameters
+    config = {name: param.default for name, param in params.items()
+              if param.default is not inspect.Parameter.empty}
+    config.update(optimizer_args)
+    return {'name': optimizer, 'args': config}
+
+def train_linear_classifier(data_files, save=False, show_graphs=False,
+                            seed=None, stratify=False, batch_size=None, features=None,
+                            scaling=None, registry=None, num_epochs=50, rate=20, decay=0.05,
+                            optimizer='newton', optimizer_args=None):
+    """
+    Train a classifier on an 80-20 split of the data and evaluate it on the
+    test split. The split is reproducible given a seed, and is optionally
+    stratified by gesture.
+
+    If batch_size is given, the data is instead kept in a memory-mapped file
+    and the classifier is trained with mini-batches gathered from it, so that
+    memory use doesn't grow with the size of the dataset. It trains for
+    num_epochs with a learning rate of rate / (1 + decay * epoch).
 
-    costs = classifier.train(X, y, rate=0.005, num_iter=3000)
+    Otherwise the classifier is trained with the named optimizer of
+    OPTIMIZERS, with the dict of optimizer_args.
+
+    If features is a FeatureExtractor, the classifier is trained on windowed
+    features instead of raw samples.
+
+    If scaling is given, it's used as the (offset, divisor) feature scaling
+    instead of computing it from the training split, such as
+    DatasetIndex.scaling(). Scaling computed from all of the data includes the
+    test split, which makes the test accuracy slightly optimistic.
+
+    If a ModelRegistry is given along with a seed, a classifier previously
+    trained on the same data with the same arguments is reused instead of
+    training again, and a newly trained classifier is saved to the registry.
+    """
+    optimizer_args = optimizer_args or {}
+    if registry is not None and seed is not None:
+        dataset_hash = registry.dataset_hash(data_files)
+        key = registry.key(dataset_hash, {
+            'seed': seed, 'stratify': stratify, 'batch_size': batch_size,
+            'minibatch': batch_size and {'num_epochs': num_epochs, 'rate': rate, 'decay': decay},
+            'optimizer': None if batch_size else _optimizer_config(optimizer, optimizer_args),
+            'features': features and features.header_defines(),
+            'scaling': scaling and [list(map(float, arr)) for arr in scaling],
+        })
+        cached = registry.get(key)
+        if cached is not None:
+            _, metadata, cls_file = cached
+            print('Reuse classifier {}'.format(cls_file))
+            return metadata['accuracy'], np.array(metadata['recalls'])
+    else:
+        registry = None
+
+    start = time.perf_counter()
+    num_features = NUM_FEATURES if features is None else features.num_outputs(NUM_FEATURES)
+    transform = None if features is None else features.transform_data
+    classifier = LinearClassifier(num_classes=NUM_CLASSES, num_features=num_features)
+    classifier.features = features
+    if scaling is not None:
+        classifier.offset, classifier.divisor = scaling
+
+    if batch_size is None:
+        data = aggregate_csv(data_files, shuffle=False, transform=transform)
+        with profiling.phase('create_dataset'):
+            train_idx, test_idx = split_indices(data[:, -1], [0.8], seed, stratify)
+            X, y = data[train_idx, :-1], data[train_idx, -1]
+            Xtest, ytest = data[test_idx, :-1], data[test_idx, -1]
+        del data
+
+        costs = classifier.train(X, y, rescale=scaling is None, optimizer=optimizer,
+                                 **optimizer_args)
+        acc, recalls = classifier.evaluate(Xtest, ytest)
+    else:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            data = aggregate_csv(data_files, shuffle=False, transform=transform,
+                                 filename=path.join(tmpdir, 'data.npy'))
+            with profiling.phase('create_dataset'):
+                train_idx, test_idx = split_indices(data[:, -1], [0.8], seed, stratify)
+            costs, (acc, recalls) = _train_in_batches(
+                classifier, data, train_idx, test_idx, batch_size, seed, scaling is None,
+                num_epochs, rate, decay)
+            del data
+
+    training_time = time.perf_counter() - start
 
     if show_graphs:
+        from matplotlib import pyplot as plt
         plt.ioff()
 
         iters = np.arange(costs.shape[0])
@@ -66,8 +312,14 @@ def train_linear_classifier(data_files, save=False, show_graphs=False):
         plt.legend(['Class {}'.format(n) for n in range(costs.shape[1])])
         plt.show()
 
-    acc, recalls = classifier.evaluate(Xtest, ytest)
-    if save:
+    if registry is not None:
+        cls_file = registry.put(key, classifier, {
+            'dataset_hash': dataset_hash, 'data_files': list(data_files),
+            'accuracy': float(acc), 'recalls': recalls.tolist(),
+            'training_time': training_time,
+        })
+        print('Save classifier to {}'.format(cls_file))
+    elif save:
         cls_file = path.join( 'data', 'classifiers',
                 dated_name('lin-cls-{:.5g}'.format(acc * 100)))
         print('Save classifier to {}'.format(cls_file))
@@ -0,0 +1,120 @@
+import itertools
+import numpy as np
+from poweredarm.classifier import LinearClassifier
+from poweredarm.data_processing import split_indices
+from poweredarm.parallel import run_parallel
+from poweredarm.util import NUM_CLASSES
+
+# Values searched for each gradient descent parameter by default
+DEFAULT_GRID = {
+    'rate': [0.0005, 0.001, 0.005, 0.01],
+    'num_iter': [100, 300, 1000, 3000],
+    'l2': [0., 0.01, 0.1, 1.],
+}
+
+def grid_configs(grid):
+    """
+    Every combination of the values in a dict mapping each parameter to a list
+    of values. Returns a list of dicts of parameters.
+    """
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+def random_configs(grid, num_configs, rng):
+    """
+    Random search, which samples num_configs distinct combinations of the grid
+    instead of trying every one of them
+    """
+    configs = grid_configs(grid)
+    chosen = rng.choice(len(configs), min(num_configs, len(configs)), replace=False)
+    return [configs[i] for i in sorted(chosen)]
+
+def _config_key(config):
+    return (config['rate'], config['l2'], config['num_iter'])
+
+def _fold_job(data, rng, val_idx, configs, check_every):
+    # Train on every row outside of the validation fold
+    mask = np.ones(data.shape[0], dtype=bool)
+    mask[val_idx] = False
+    X, y = data[mask, :-1], data[mask, -1]
+    yval = data[val_idx, -1]
+
+    # Scale the fold once, instead of once for every configuration
+    classifier = LinearClassifier(NUM_CLASSES, X.shape[1])
+    classifier.fit_scaling(X)
+    X = np.c_[ np.ones(X.shape[0]), classifier.scale_features(X) ]
+    Xval = np.c_[ np.ones(yval.shape[0]), classifier.scale_features(data[val_idx, :-1]) ]
+
+    # Configurations that only differ by num_iter share a single run, which
+    # is scored as it reaches each of their iteration counts
+    runs = {}
+    for config in configs:
+        runs.setdefault((config['rate'], config['l2']), set()).add(config['num_iter'])
+
+    scores = {}
+    for (rate, l2), num_iters in runs.items():
+        classifier.weight[...] = 0
+        start_cost = classifier.cost(X, y)
+        # Check the cost every check_every iterations, so a diverging run stops early
+        checks = set(range(check_every, max(num_iters), check_every)) if check_every else set()
+        done = 0
+        with np.errstate(over='ignore', invalid='ignore'):
+            for num_iter in sorted(checks | num_iters):
+                cost = classifier.fused_gradient_descent(
+                    X, y, rate, num_iter - done, cost_every=num_iter - done, l2=l2)[-1]
+                done = num_iter
+                if not np.all(np.isfinite(cost)) or np.any(cost > start_cost):
+                    # Diverged, so leave this and the longer runs unscored
+                    break
+                if num_iter in num_iters:
+                    predictions = np.argmax(Xval @ classifier.weight, 1)
+                    scores[(rate, l2, num_iter)] = np.mean(predictions == yval)
+    return scores
+
+def cross_validate(data, configs, num_folds=5, seed=None, max_workers=None, check_every=100):
+    """
+    Score gradient descent configurations by k-fold cross validation. The
+    folds are stratified by class and run in parallel.
+
+    :param data: Dataset with the label in the last column.
+    :param configs: List of dicts with the 'rate', 'num_iter' and 'l2' of
+    each configuration.
+    :param check_every: Abandon a configuration once its training cost is
+    worse than at the start, checking after every this many iterations.
+    :returns: List of (config, mean validation accuracy) from best to worst.
+    Configurations that diverged on any fold have an accuracy of nan and
+    come last.
+    """
+    folds = split_indices(data[:, -1], [1 / num_folds] * (num_folds - 1), seed, stratify=True)
+    results = run_parallel(_fold_job, data, [(fold, configs, check_every) for fold in folds],
+                           seed, max_workers)
+
+    ranked = []
+    for config in configs:
+        key = _config_key(config)
+        ranked.append((config, np.mean([scores.get(key, np.nan) for scores in results])))
+    ranked.sort(key=lambda result: -result[1] if np.isfinite(result[1]) else np.inf)
+    return ranked
+
+def best_config(ranked):
+    """
+    The (config, accuracy) with the best accuracy in the results of
+    cross_validate(), ignoring configurations that diverged. Raises
+    ValueError if they all did.
+    """
+    scored = [result for result in ranked if np.isfinite(result[1])]
+    if not scored:
+        raise ValueError('Every configuration diverged')
+    return max(scored, key=lambda result: result[1])
+
+def train_best(data, ranked):
+    """
+    Train a classifier on all of the data with the best configuration found
+    by cross_validate()
+    """
+    config, _ = best_config(ranked)
+    classifier = LinearClassifier(NUM_CLASSES, data.shape[1] - 1)
+    classifier.train(data[:, :-1], data[:, -1], optimizer='gradient_descent',
+                     rate=config['rate'], num_iter=config['num_iter'],
+                     cost_every=0, l2=config['l2'])
+    return classifier
@@ -1,13 +1,36 @@
 # Entry point script
+import atexit
 import os
 import sys
-from functools import reduce
-from poweredarm.classifier import LinearClassifier
-from poweredarm.data_processing import collect_from_serial, graph_csv
-from poweredarm.train_classifier import (train_linear_classifier,
-                                         evaluate_linear_classifier,
-                                         plot_learning_curves)
-from poweredarm.util import Gesture, dated_name
+from functools import lru_cache, reduce
+from poweredarm import profiling
+from poweredarm.util import Gesture, dated_name, NUM_FEATURES
+
+# Each command imports the modules it needs, so that commands like header don't
+# pay for loading matplotlib or pyserial
+
+# Where collect saves data, and the data files selected by a query come from
+DATASET_DIR = os.path.join('data', 'dataset')
+
+@lru_cache(maxsize=None)
+def dataset_index():
+    """
+    Index of DATASET_DIR, brought up to date with the files in it once per run
+    """
+    from poweredarm.dataset_index import DatasetIndex
+    index = DatasetIndex(DATASET_DIR).update()
+    index.save()
+    return index
+
+def select_data_files(query):
+    """
+    Data files selected by the --gesture, --after and --before options
+    """
+    if not query:
+        return []
+    files = dataset_index().select(**query)
+    print('Selected {} data files from {}'.format(len(files), DATASET_DIR))
+    return files
 
 def print_results(acc, recalls):
     print('Classifier predicted with accuracy of: {}'.format(acc * 100))
@@ -16,41 +39,130 @@ def print_results(acc, recalls):
         print('Class {} has recall of: {}'.format(cls, recall * 100))
 
 def print_help(retcode):
+    from poweredarm.data_processing import default_port
     print('Usage: python -m poweredarm.main [command] [..args]')
     print('')
 
     print('COMMAND train')
-    print('Usage: train [..data_files]')
-    print('Trains a classifier using the supplied CSV data files and saves it.')
+    print('Usage: train [--seed=N] [--features=WINDOW[:kinds]] [--batch-size=N ' +
+          '[--epochs=N] [--rate=R] [--decay=D]] [..data_files]')
+    print('Trains a classifier using the supplied CSV data files and saves it. ' +
+          'With --seed, the train/test split is reproducible, and a classifier ' +
+          'previously trained on identical data with the same seed is reused ' +
+          'instead of retraining. Cached classifiers have a .json file of metadata, ' +
+          'and the least recently used are deleted once there are more than 100. ' +
+          'With --features, the classifier is trained on features computed over ' +
+          'windows of WINDOW samples, of the comma separated kinds (default ' +
+          'mav,rms,wl,ssc). The header, evaluate and predict-live commands use the ' +
+          'same features for the saved classifier. With --batch-size, the data is ' +
+          'kept in a memory-mapped file and trained on in mini-batches of N samples, ' +
+          'so memory use does not grow with the dataset, for --epochs epochs (default ' +
+          '50) with a learning rate of R / (1 + D * epoch) (default 20 and 0.05).')
     print('')
 
     print('COMMAND curve')
     print('Usage: curve [..data_files]')
-    print('Plot a learning curve for the data from 5 to 2000 samples.')
+    print('Plot a learning curve for the data from 6 to 2000 samples, using ' +
+          'geometrically spaced training set sizes.')
+    print('')
+
+    print('COMMAND tune')
+    print('Usage: tune [--random=N] [--folds=K] [--seed=N] [..data_files]')
+    print('Searches for the gradient descent learning rate, number of iterations and ' +
+          'L2 penalty with the best K-fold (default 5) cross-validated accuracy, then ' +
+          'trains a classifier on all the data with them and saves it. Tries every ' +
+          'combination of the default values, or N random ones with --random. With ' +
+          '--seed, the random configurations and the folds are reproducible.')
     print('')
 
     print('COMMAND evaluate')
     print('Usage: evaluate classifier_file [..data_files]')
     print('Loads a classifier from an existing file and evaluates ' +
-          'how accurately it predicts the supplied CSV dataset.')
+          'how accurately it predicts the supplied CSV dataset, along with the ' +
+          'precision, recall and F1 score of each class.')
+    print('')
+
+    print('COMMAND compare')
+    print('Usage: compare [..classifier_files] [..data_files]')
+    print('Evaluates many classifiers on the same CSV datasets and ranks them by ' +
+          'accuracy, printing the recall of each class and the confusion matrices. ' +
+          'Arguments ending in .npz are classifiers, and directories stand for all the ' +
+          'classifiers inside them, such as data/classifiers.')
     print('')
 
     print('COMMAND header')
-    print('Usage: header classifer_file')
+    print('Usage: header classifer_file [fixed_bits [..data_files]] [--blob] [--smooth=WINDOW[:MIN_VOTES]]')
     print('Loads a classifier from an existing file and generates ' +
-          'a C header file from its parameters.')
+          'a C header file from its parameters. If fixed_bits (8 or 16) is given, ' +
+          'the header also has an integer-only version of the classifier, which is ' +
+          'checked against the original on any supplied CSV datasets. With --blob, ' +
+          'also writes the parameters to out/classifier.bin, which the ESP32 can load ' +
+          'from a flash partition when built with CLASSIFIER_PARTITION.')
     print('')
 
     print('COMMAND collect')
-    print('Usage: collect gesture_name')
+    print('Usage: collect gesture_name [seconds] [--binary] [..--port=PORT[:gesture_name]]')
     print('Collects training EMG data for a specific gesture from the ESP32. ' +
-          'Monitors serial port for 15s, collecting all received EMG data into ' +
-          'a CSV file for later use.')
+          'Monitors serial port for some seconds (default 15), collecting all ' +
+          'received EMG data into a CSV file for later use. Pass --port once for ' +
+          'each device to collect from several at the same time, each into its own ' +
+          'file, optionally labelled with a different gesture. The time each sample ' +
+          'arrived is saved next to each file as .times.npy.')
+    print('')
+
+    print('COMMAND predict-live')
+    print('Usage: predict-live classifier_file [source] [window] [--binary] [--smooth=WINDOW[:MIN_VOTES]]')
+    print('Loads a classifier from an existing file and prints its predictions ' +
+          'for EMG data streamed from the ESP32, in batches of window samples ' +
+          '(default 8). The source is a serial port (default {}), a captured '.format(default_port()) +
+          'serial log, or a CSV dataset to replay. Prints latency statistics at the end.')
+    print('')
+
+    print('COMMAND smoothing')
+    print('Usage: smoothing classifier_file [..data_files] [--windows=1,2,4,...] [--share=S]')
+    print('Smooths the predictions of a classifier on CSV datasets with each window ' +
+          'size, and prints the accuracy, the switches between classes and the latency ' +
+          'in samples to follow each change of gesture. The files are treated as one ' +
+          'recording in the given order. A class takes over once more than half of the ' +
+          'window, or the share S of it, agrees on it.')
+    print('')
+
+    print('Add --smooth=WINDOW[:MIN_VOTES] to header and predict-live to smooth the ' +
+          'predictions with a majority vote over the last WINDOW of them, switching class ' +
+          'once at least MIN_VOTES (default more than half) agree. The header configures ' +
+          'the ESP32 to smooth its predictions the same way.')
+    print('')
+
+    print('Add --binary to collect and predict-live if the ESP32 is built with ' +
+          'BINARY_FRAMES, so that it sends binary frames instead of text lines.')
     print('')
 
     print('COMMAND emg')
-    print('Usage: emg csv_file')
-    print('Graphs a CSV EMG dataset over time. Assumes that the rows are in chronological order.')
+    print('Usage: emg csv_file [--pairs]')
+    print('Graphs a CSV EMG dataset over time. Assumes that the rows are in chronological order. ' +
+          'With --pairs, graphs the relationships between each pair of channels instead, ' +
+          'from a random sample of the rows.')
+    print('')
+
+    print('COMMAND benchmark')
+    print('Usage: benchmark [output_file [baseline_file [threshold]]]')
+    print('Times training, prediction, data loading and header generation on ' +
+          'synthetic data. Saves the results as JSON to output_file if supplied. ' +
+          'If a baseline file from a previous run is supplied, fails when any ' +
+          'benchmark is more than threshold percent (default 20) slower.')
+    print('')
+
+    print('Add --profile to any command to print how long each phase took, such as ' +
+          'loading data, training and saving. Add --profile-json=FILE to also save the ' +
+          'timings as JSON, --cprofile to include the slowest functions, and ' +
+          '--tracemalloc to include the peak memory use.')
+    print('')
+
+    print('The train, curve, tune, evaluate and smoothing commands also take data files from ' +
+          '{} selected by the options --gesture=NAME[,NAME..], '.format(DATASET_DIR) +
+          '--after=DATE and --before=DATE, where dates are like 2019-06-01 or ' +
+          '2019-06-01T12:00. The selection uses an index of the files, which is kept ' +
+          'up to date automatically.')
     print('')
 
     print('COMMAND help')
@@ -59,57 +171,304 @@ def print_help(retcode):
     sys.exit(retcode)
 
 if __name__ == '__main__':
+    # The ESP32 sends binary frames instead of text lines
+    binary = '--binary' in sys.argv
+    if binary:
+        sys.argv.remove('--binary')
+
+    # Smoothing of predictions, as --smooth=WINDOW[:MIN_VOTES]
+    smooth = next((arg for arg in sys.argv if arg.startswith('--smooth=')), None)
+    if smooth:
+        sys.argv.remove(smooth)
+        smooth = [int(value) for value in smooth[len('--smooth='):].split(':')]
+
+    # Options that select data files from the dataset index
+    query = {}
+    for arg in [arg for arg in sys.argv if arg.startswith(('--gesture=', '--after=', '--before='))]:
+        sys.argv.remove(arg)
+        name, value = arg[2:].split('=', 1)
+        query['gestures' if name == 'gesture' else name] = (
+            value.split(',') if name == 'gesture' else value)
+
+    # Profiling options, which are all off by default
+    profile_options = [arg for arg in sys.argv if arg.startswith(('--profile', '--cprofile',
+                                                                  '--tracemalloc'))]
+    for arg in profile_options:
+        sys.argv.remove(arg)
+    if profile_options:
+        profile_json = next((arg.split('=', 1)[1] for arg in profile_options
+                             if arg.startswith('--profile-json=')), None)
+        profiler = profiling.Profiler(use_cprofile='--cprofile' in profile_options,
+                                      use_tracemalloc='--tracemalloc' in profile_options)
+
+        def report():
+            profiling.disable()
+            print(profiler.summary())
+            if profile_json is not None:
+                profiler.save(profile_json)
+
+        # Also report when a command exits early
+        atexit.register(report)
+        profiling.enable(profiler)
+
     try:
         command = sys.argv[1]
     except IndexError:
         print_help(1)
 
     if command == 'train':
-        data_files = sys.argv[2:]
+        from poweredarm.train_classifier import train_linear_classifier
+        options = dict(arg[2:].split('=', 1) for arg in sys.argv[2:] if arg.startswith('--'))
+        files = [arg for arg in sys.argv[2:] if not arg.startswith('--')]
+        data_files = files + select_data_files(query)
         if len(data_files) == 0:
             print("No data files detected for the 'train' option")
             sys.exit(1)
 
-        acc, recalls = train_linear_classifier(data_files, True, True)
+        seed = int(options['seed']) if 'seed' in options else None
+        features = None
+        if 'features' in options:
+            from poweredarm.features import FeatureExtractor, KINDS
+            window, _, kinds = options['features'].partition(':')
+            features = FeatureExtractor(int(window), kinds.split(',') if kinds else KINDS)
+
+        # With a seed the split is reproducible, so the classifier can be cached
+        registry = None
+        if seed is not None:
+            from poweredarm.registry import ModelRegistry
+            registry = ModelRegistry(os.path.join('data', 'classifiers'))
+        minibatch = {}
+        if 'batch-size' in options:
+            minibatch = {'batch_size': int(options['batch-size']),
+                         'num_epochs': int(options.get('epochs', 50)),
+                         'rate': float(options.get('rate', 20)),
+                         'decay': float(options.get('decay', 0.05))}
+        acc, recalls = train_linear_classifier(data_files, True, True, seed=seed,
+                                               features=features, registry=registry,
+                                               **minibatch)
         print_results(acc, recalls)
 
     elif command == 'curve':
-        data_files = sys.argv[2:]
+        from poweredarm.train_classifier import plot_learning_curves
+        data_files = sys.argv[2:] + select_data_files(query)
         if len(data_files) == 0:
             print("No data files detected for the 'curve' option")
             sys.exit(1)
 
         plot_learning_curves(data_files)
 
+    elif command == 'tune':
+        import numpy as np
+        from poweredarm.data_processing import aggregate_csv
+        from poweredarm.tuning import (DEFAULT_GRID, grid_configs, random_configs,
+                                       cross_validate, best_config, train_best)
+        options = {arg.split('=', 1)[0]: int(arg.split('=', 1)[1])
+                   for arg in sys.argv[2:] if arg.startswith('--')}
+        data_files = [arg for arg in sys.argv[2:] if not arg.startswith('--')] + select_data_files(query)
+        if len(data_files) == 0:
+            print("No data files detected for the 'tune' option")
+            sys.exit(1)
+
+        seed = options.get('--seed')
+        if '--random' in options:
+            configs = random_configs(DEFAULT_GRID, options['--random'], np.random.RandomState(seed))
+        else:
+            configs = grid_configs(DEFAULT_GRID)
+        data = aggregate_csv(data_files, shuffle=False)
+        ranked = cross_validate(data, configs, options.get('--folds', 5), seed=seed)
+
+        print('{:>9} {:>9} {:>6} {:>9}'.format('Rate', 'Iters', 'L2', 'Accuracy'))
+        for config, acc in ranked[:10]:
+            print('{rate:9g} {num_iter:9d} {l2:6g}'.format(**config) + ' {:9.3f}'.format(acc * 100))
+
+        try:
+            _, acc = best_config(ranked)
+        except ValueError:
+            print('Every configuration diverged, so there is no classifier to save')
+            sys.exit(1)
+        classifier = train_best(data, ranked)
+        cls_file = os.path.join('data', 'classifiers',
+                                dated_name('lin-cls-tuned-{:.5g}'.format(acc * 100)))
+        print('Save classifier to {}'.format(cls_file))
+        classifier.save(cls_file)
+
     elif command == 'evaluate':
+        from poweredarm.train_classifier import evaluate_linear_classifier
         classifier_file = sys.argv[2]
-        data_files = sys.argv[3:]
+        data_files = sys.argv[3:] + select_data_files(query)
         if len(data_files) == 0:
             print("No data files detected for the 'evaluate' option")
             sys.exit(1)
 
-        acc, recalls = evaluate_linear_classifier(classifier_file, data_files)
-        print_results(acc, recalls)
+        confusion = evaluate_linear_classifier(classifier_file, data_files)
+        print_results(*confusion.accuracy_recall())
+        print('')
+        print(confusion.report())
+
+    elif command == 'compare':
+        from poweredarm.train_classifier import evaluate_classifiers
+        classifier_files, data_files = [], []
+        for arg in sys.argv[2:]:
+            if os.path.isdir(arg):
+                classifier_files += sorted(os.path.join(arg, f) for f in os.listdir(arg)
+                                           if f.endswith('.npz'))
+            elif arg.endswith('.npz'):
+                classifier_files.append(arg)
+            else:
+                data_files.append(arg)
+        if len(classifier_files) == 0 or len(data_files) == 0:
+            print("The 'compare' option needs both classifier files and data files")
+            sys.exit(1)
+
+        results, skipped = evaluate_classifiers(classifier_files, data_files)
+        for fname in skipped:
+            print('Skipped {}, which does not match the data'.format(fname))
+        num_classes = len(results[0]['recalls']) if results else 0
+        print('{:>4} {:>9}  {}  {}'.format('Rank', 'Accuracy', ' '.join(
+            'Recall {}'.format(cls) for cls in range(num_classes)), 'Classifier'))
+        for rank, result in enumerate(results, 1):
+            print('{:4d} {:9.3f}  {}  {}'.format(
+                rank, result['accuracy'] * 100,
+                ' '.join('{:8.3f}'.format(recall * 100) for recall in result['recalls']),
+                result['classifier']))
+        for result in results:
+            print('')
+            print('Confusion matrix of {} (rows are true classes, columns are predictions)'.format(
+                result['classifier']))
+            print(result['confusion'])
 
     elif command == 'header':
+        from poweredarm.classifier import LinearClassifier, FixedPointClassifier
+        from poweredarm.data_processing import aggregate_csv, create_dataset
+        blob = '--blob' in sys.argv
+        if blob:
+            sys.argv.remove('--blob')
         classifier_file = sys.argv[2]
         classifier = LinearClassifier.load(classifier_file)
 
         header = os.path.join('out', 'classifier.h')
         if not os.path.exists('out'):
             os.mkdir('out')
-        classifier.to_header(classifier_file, header)
+        fixed_bits = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        if fixed_bits is not None and classifier.features is not None:
+            print('The fixed point classifier only supports classifiers trained on raw samples')
+            sys.exit(1)
+        smoothing = None
+        if smooth:
+            from poweredarm.smoothing import PredictionSmoother
+            smoothing = PredictionSmoother(classifier.num_classes, *smooth)
+        classifier.to_header(classifier_file, header, fixed_bits, smoothing=smoothing)
         print('Generate header {} using classifier {}'.format(header, classifier_file))
+        if blob:
+            blob_file = os.path.join('out', 'classifier.bin')
+            classifier.to_blob(blob_file)
+            print('Generate blob {} using classifier {}'.format(blob_file, classifier_file))
+
+        data_files = sys.argv[4:]
+        if fixed_bits is not None and data_files:
+            X, _ = create_dataset(aggregate_csv(data_files), [])
+            fixed = FixedPointClassifier.from_classifier(classifier, fixed_bits)
+            print('Fixed point predictions match for {}% of samples'.format(
+                fixed.agreement(classifier, X) * 100))
 
     elif command == 'collect':
+        # Each --port=PORT[:GESTURE] is a device to collect from at the same time
+        ports = [arg[len('--port='):] for arg in sys.argv if arg.startswith('--port=')]
+        args = [arg for arg in sys.argv if not arg.startswith('--port=')]
         # Needs to be one of the names in the Gesture enum
-        gesture = sys.argv[2]
+        gesture = args[2]
         label = Gesture[gesture].value
-        collect_from_serial('data/dataset/{}.csv'.format(dated_name(gesture)), label)
+        duration = float(args[3]) if len(args) > 3 else 15
+
+        if not ports:
+            from poweredarm.data_processing import collect_from_serial
+            data_files = [os.path.join(DATASET_DIR, '{}.csv'.format(dated_name(gesture)))]
+            counters = collect_from_serial(data_files[0], label, duration, binary=binary)
+            print('Collected {frames} samples, {malformed} malformed lines, '
+                  '{dropped_chunks} dropped reads'.format(**counters))
+        else:
+            from poweredarm.async_collector import DeviceCollector, collect_from_devices
+            devices = []
+            for port in ports:
+                # Split off a gesture for this device, without breaking up COM ports
+                device_port, _, device_gesture = port.partition(':')
+                device_gesture = device_gesture or gesture
+                name = '{}-{}.csv'.format(dated_name(device_gesture),
+                                          os.path.basename(device_port))
+                devices.append(DeviceCollector(device_port, os.path.join(DATASET_DIR, name),
+                                               Gesture[device_gesture].value, binary))
+            for device, counters in zip(devices, collect_from_devices(devices, duration)):
+                print('Collected {frames} samples, {malformed} malformed lines '.format(**counters) +
+                      'from {} into {}'.format(device.source, device.filename))
+            data_files = [device.filename for device in devices]
+
+        # Index the new sessions, so that they can be selected by queries
+        from poweredarm.dataset_index import DatasetIndex
+        index = DatasetIndex(DATASET_DIR)
+        for data_file in data_files:
+            index.add(data_file)
+        index.save()
+
+    elif command == 'predict-live':
+        from poweredarm.classifier import LinearClassifier
+        from poweredarm.data_processing import default_port, open_source, read_samples, load_csv
+        from poweredarm.live import predict_live
+        classifier = LinearClassifier.load(sys.argv[2])
+        source = sys.argv[3] if len(sys.argv) > 3 else default_port()
+        window = int(sys.argv[4]) if len(sys.argv) > 4 else 8
+
+        if smooth:
+            from poweredarm.smoothing import PredictionSmoother
+            smoother = PredictionSmoother(classifier.num_classes, *smooth)
+
+        def emit(predictions):
+            if smooth:
+                predictions = smoother.push_many(predictions)
+            for cls in predictions:
+                print(Gesture(cls).name)
+
+        if source.endswith(('.csv', '.npy')):
+            stats = predict_live(classifier, load_csv(source)[:, :NUM_FEATURES], emit, window)
+        else:
+            with open_source(source, binary=binary) as stream:
+                stats = predict_live(classifier, read_samples(stream, binary), emit, window)
+        print(stats)
+
+    elif command == 'smoothing':
+        from poweredarm.train_classifier import evaluate_smoothing
+        options = dict(arg[2:].split('=', 1) for arg in sys.argv[3:] if arg.startswith('--'))
+        data_files = [arg for arg in sys.argv[3:] if not arg.startswith('--')] + select_data_files(query)
+        windows = [int(window) for window in options.get('windows', '1,2,4,8,16,32,64').split(',')]
+        share = float(options['share']) if 'share' in options else None
+        print('{:>7} {:>6} {:>9} {:>13} {:>13} {:>12} {:>7}'.format(
+            'window', 'votes', 'accuracy', 'switches/1k', 'mean latency', 'max latency', 'missed'))
+        for stats in evaluate_smoothing(sys.argv[2], data_files, windows, share):
+            print('{window:7} {min_votes:6} {accuracy:9.2%} {switches_per_1000:13.2f} '
+                  '{mean_latency:13.1f} {max_latency:12} {missed:7}'.format(**stats))
 
     elif command == 'emg':
+        from poweredarm.data_processing import graph_csv, graph_relationships_csv
         csvfile = sys.argv[2]
-        graph_csv(csvfile)
+        if '--pairs' in sys.argv:
+            graph_relationships_csv(csvfile)
+        else:
+            graph_csv(csvfile)
+
+    elif command == 'benchmark':
+        from poweredarm.benchmark import run_benchmarks, compare, save_results, load_results
+        results = run_benchmarks()
+        for name, result in sorted(results.items()):
+            print('{:45} {:10.6f}s'.format(name, result['seconds']))
+        if len(sys.argv) > 2:
+            save_results(results, sys.argv[2])
+
+        if len(sys.argv) > 3:
+            threshold = float(sys.argv[4]) if len(sys.argv) > 4 else 20
+            regressions = compare(results, load_results(sys.argv[3]), threshold)
+            for name, before, after in regressions:
+                print('Regression in {}: {:.6f}s -> {:.6f}s'.format(name, before, after))
+            if regressions:
+                sys.exit(1)
 
     elif command == 'help':
         print_help(0)
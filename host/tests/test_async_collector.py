@@ -0,0 +1,40 @@
+import os
+import threading
+import numpy as np
+from poweredarm.async_collector import DeviceCollector, collect_from_devices
+from poweredarm.data_processing import load_csv
+
+def frame_line(values):
+    return '_DATA_: {} \n'.format(' '.join(str(v) for v in values)).encode()
+
+def test_collect_from_devices(tmp_path):
+    ptys = [os.openpty(), os.openpty()]
+    log = tmp_path / 'serial.log'
+    log.write_bytes(b''.join(frame_line(range(i, i + 8)) for i in range(30)))
+    try:
+        # Opening a serial port drops anything already waiting, so send the
+        # frames once the collection has started
+        def send():
+            for count, (master, _) in zip([40, 60], ptys):
+                os.write(master, b''.join(frame_line(range(i, i + 8)) for i in range(count)))
+        sender = threading.Timer(0.1, send)
+        sender.start()
+        devices = [DeviceCollector(os.ttyname(slave), str(tmp_path / 'pty{}.csv'.format(n)), n)
+                   for n, (_, slave) in enumerate(ptys)]
+        devices.append(DeviceCollector(str(log), str(tmp_path / 'replay.csv'), 3))
+        counters = collect_from_devices(devices, duration=0.5)
+    finally:
+        sender.join()
+        for master, slave in ptys:
+            os.close(master)
+            os.close(slave)
+
+    assert [c['frames'] for c in counters] == [40, 60, 30]
+    for device, rows in zip(devices, [40, 60, 30]):
+        data = load_csv(device.filename, cache=False)
+        assert data.shape == (rows, 9)
+        assert np.all(data[:, -1] == device.label)
+        assert np.array_equal(data[:, 0], np.arange(rows))
+        times = np.load(device.times_filename)
+        assert times.shape == (rows,)
+        assert np.all(np.diff(times) >= 0) and np.all((times >= 0) & (times < 0.5 + 0.2))
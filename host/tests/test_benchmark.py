@@ -0,0 +1,26 @@
+import numpy as np
+from poweredarm.benchmark import (synthetic_data, run_benchmarks, compare,
+                                  save_results, load_results)
+
+def test_synthetic_data():
+    data = synthetic_data(100, 8, 4)
+    assert data.shape == (100, 9)
+    assert set(np.unique(data[:, -1])) <= set(range(4))
+    assert np.array_equal(data, synthetic_data(100, 8, 4))
+
+def test_compare():
+    baseline = {'a': {'seconds': 1.0}, 'b': {'seconds': 1.0}, 'removed': {'seconds': 1.0}}
+    results = {'a': {'seconds': 1.1}, 'b': {'seconds': 1.3}, 'new': {'seconds': 5.0}}
+    assert compare(results, baseline, 20) == [('b', 1.0, 1.3)]
+    assert compare(results, baseline, 5) == [('a', 1.0, 1.1), ('b', 1.0, 1.3)]
+
+def test_run_benchmarks(tmp_path):
+    results = run_benchmarks(quick=True, repeat=1)
+    assert 'predict/10000' in results and 'to_header/32x10' in results
+    assert all(result['seconds'] > 0 for result in results.values())
+    assert results['predict/10000']['samples_per_second'] > 0
+
+    fname = str(tmp_path / 'benchmarks' / 'results.json')
+    save_results(results, fname)
+    assert load_results(fname) == results
+    assert compare(results, load_results(fname), 0) == []
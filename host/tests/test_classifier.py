@@ -1,7 +1,8 @@
 from os import path
 import numpy as np
 import pytest
-from poweredarm.classifier import LinearClassifier, sigmoid
+from poweredarm.classifier import (LinearClassifier, RunningScaler, FixedPointClassifier,
+                                  sigmoid, time_decay, predict_many, c_array)
 
 def test_sigmoid():
     sig1 = 1 / (1 + np.exp(-1))
@@ -133,12 +134,197 @@ def test_header():
 
         assert int(defines['CLASSIFIER_NUM_FEATURES']) == classifier.num_features
         assert int(defines['CLASSIFIER_NUM_CLASSES']) == classifier.num_classes
-        assert np.allclose(
-            parse_arr(defines['CLASSIFIER_WEIGHT'], classifier.weight.shape), 
-            classifier.weight)
-        assert np.allclose(
-            parse_arr(defines['CLASSIFIER_OFFSET'], classifier.offset.shape),
-            classifier.offset)
-        assert np.allclose(
-            parse_arr(defines['CLASSIFIER_DIVISOR'], classifier.divisor.shape),
-            classifier.divisor)
+        # The values are written exactly
+        for name, arr in [('CLASSIFIER_WEIGHT', classifier.weight),
+                          ('CLASSIFIER_OFFSET', classifier.offset),
+                          ('CLASSIFIER_DIVISOR', classifier.divisor)]:
+            assert np.array_equal(parse_arr(defines[name], arr.shape), arr.astype(np.float32))
+
+def test_header_is_deterministic(tmp_path):
+    classifier = make_classifier(4, 5)
+    outputs = []
+    for i in range(2):
+        header = str(tmp_path / 'classifier-{}.h'.format(i))
+        classifier.to_header('placeholder', header, fixed_bits=8)
+        with open(header, 'rb') as file:
+            outputs.append(file.read())
+    assert outputs[0] == outputs[1]
+
+def test_c_array():
+    assert c_array(np.array([[1, -2], [3, 4]])) == '{{1,-2},{3,4}}'
+    assert c_array(np.array([0.1, 1e-20, 3.0])) == '{0.100000001,9.99999968e-21,3}'
+
+def test_blob(tmp_path):
+    classifier = make_classifier(4, 5)
+    blob = str(tmp_path / 'classifier.bin')
+    classifier.to_blob(blob)
+    loaded = LinearClassifier.from_blob(blob)
+    assert np.array_equal(loaded.weight, classifier.weight)
+    assert np.array_equal(loaded.offset, classifier.offset.astype(np.float32))
+    assert np.array_equal(loaded.divisor, classifier.divisor.astype(np.float32))
+
+    with open(blob, 'rb') as file:
+        data = bytearray(file.read())
+    assert len(data) == 16 + 4 * (5 * 5 + 2 * 4)
+    # Corrupt a weight, which the checksum catches
+    data[20] ^= 1
+    with open(blob, 'wb') as file:
+        file.write(data)
+    with pytest.raises(ValueError):
+        LinearClassifier.from_blob(blob)
+
+def test_folded_weight():
+    classifier = make_classifier(3, 4)
+    X = np.random.rand(20, 3) * 100
+    scores = np.c_[ np.ones(20), classifier.scale_features(X) ] @ classifier.weight
+    folded = np.c_[ np.ones(20), X ] @ classifier.folded_weight()
+    assert np.allclose(scores, folded, rtol=1e-4, atol=1e-3)
+
+def test_running_scaler():
+    X = np.random.rand(30, 5)
+    scaler = RunningScaler(5)
+    # Updating in uneven chunks should match computing over the whole dataset
+    for start, end in [(0, 1), (1, 1), (1, 12), (12, 30)]:
+        scaler.update(X[start:end, :])
+
+    classifier = LinearClassifier(num_classes=2, num_features=5)
+    classifier.fit_scaling(X)
+    assert scaler.count == 30
+    assert np.allclose(scaler.offset, classifier.offset)
+    assert np.allclose(scaler.divisor, classifier.divisor)
+
+@pytest.mark.parametrize('batch_size', [1, 3, 64])
+def test_train_minibatch(batch_size):
+    X = np.array([[2, 4],
+                  [100, 5],
+                  [6, 88],
+                  [90, 111]])
+    y = np.array([0, 1, 2, 3])
+    # Stream the same data as two chunks
+    chunks = lambda: [(X[:2, :], y[:2]), (X[2:, :], y[2:])]
+
+    classifier = LinearClassifier(num_classes=4, num_features=2)
+    costs = classifier.train_minibatch(chunks, batch_size=batch_size, num_epochs=300,
+                                       schedule=time_decay(2, 0.001),
+                                       rng=np.random.RandomState(0))
+    assert costs.shape == (300, 4)
+    assert (costs[-1, :] < costs[0, :]).all()
+    assert np.allclose(classifier.offset, np.mean(X, 0))
+    acc, _ = classifier.evaluate(X, y)
+    assert acc == 1
+
+def test_newton():
+    X = np.array([[2, 4],
+                  [100, 5],
+                  [6, 88],
+                  [90, 111],
+                  [50, 50]])
+    y = np.array([0, 1, 2, 3, 0])
+
+    classifier = LinearClassifier(num_classes=4, num_features=2)
+    costs = classifier.train(X, y, optimizer='newton', num_iter=100, tol=1e-8)
+    # Should converge well before running out of iterations
+    assert costs.shape[0] < 100 and costs.shape[1] == 4
+    assert (costs[-1, :] < costs[0, :]).all()
+    assert np.allclose(costs[-1, :], costs[-2, :], atol=1e-8)
+    acc, _ = classifier.evaluate(X, y)
+    assert acc == 1
+
+def test_custom_optimizer():
+    def optimizer(classifier, X, y, value):
+        classifier.weight[:, :] = value
+        return np.zeros((1, classifier.num_classes))
+
+    classifier = LinearClassifier(num_classes=3, num_features=2)
+    costs = classifier.train(np.random.rand(5, 2), np.zeros(5), optimizer=optimizer, value=7)
+    assert costs.shape == (1, 3)
+    assert (classifier.weight == 7).all()
+
+@pytest.mark.parametrize('cost_every', [None, 1, 3])
+def test_fused_gradient_descent(cost_every):
+    X = np.c_[ np.ones(10), np.random.rand(10, 3) ]
+    y = np.random.randint(0, 4, 10)
+    weight = np.random.rand(4, 4)
+
+    # Should match plain gradient descent on the logistic regression cost
+    expected = LinearClassifier(num_classes=4, num_features=3, init_weight=weight)
+    expected_costs = expected.gradient_descent(lambda: expected.cost_delta(X, y),
+                                               lambda: expected.cost(X, y), 0.1, 9)
+    classifier = LinearClassifier(num_classes=4, num_features=3, init_weight=weight)
+    costs = classifier.fused_gradient_descent(X, y, 0.1, 9, cost_every=cost_every)
+
+    assert np.allclose(classifier.weight, expected.weight)
+    if cost_every:
+        assert np.allclose(costs, expected_costs[cost_every - 1::cost_every, :])
+    else:
+        assert costs.shape == (0, 4)
+
+@pytest.mark.parametrize('bits', [8, 16])
+def test_fixed_point_classifier(bits):
+    classifier = make_classifier(8, 4)
+    classifier.train(np.random.randint(0, 1000, (50, 8)), np.random.randint(0, 4, 50),
+                     rate=0.01, num_iter=20)
+    fixed = FixedPointClassifier.from_classifier(classifier, bits)
+    assert np.abs(fixed.weight).max() == 2**(bits - 1) - 1
+    assert fixed.multiplier.max() == 2**FixedPointClassifier.MULTIPLIER_BITS
+
+    X = np.random.randint(0, 1000, (500, 8))
+    # Integer scores should match the float scores in units of the largest
+    # class scale, up to rounding
+    folded = classifier.folded_weight()
+    scores = np.c_[ np.ones(500), X ] @ folded
+    max_scale = np.max(np.abs(folded[1:, :])) / (2**(bits - 1) - 1)
+    fixed_scores = fixed.scores(X) / 2**FixedPointClassifier.MULTIPLIER_BITS * max_scale
+    assert np.allclose(fixed_scores, scores, atol=0.05 * np.abs(scores).max())
+    assert fixed.agreement(classifier, X) > (0.95 if bits == 8 else 0.99)
+
+def test_fixed_point_header():
+    header = path.join('tests', 'data', 'headers', 'classifier.h')
+    classifier = make_classifier(4, 5)
+    classifier.to_header('placeholder', header, fixed_bits=16)
+    fixed = FixedPointClassifier.from_classifier(classifier, 16)
+
+    defines = {}
+    with open(header, 'r') as file:
+        for line in file:
+            if line.startswith('#define'):
+                _, name, val = line.split()
+                defines[name] = val
+
+    def parse_arr(string):
+        return np.fromstring(string.replace('{', '').replace('}', ''), dtype=np.int64, sep=',')
+
+    assert int(defines['CLASSIFIER_FIXED_BITS']) == 16
+    assert np.array_equal(parse_arr(defines['CLASSIFIER_FIXED_WEIGHT']), fixed.weight.flatten())
+    assert np.array_equal(parse_arr(defines['CLASSIFIER_FIXED_BIAS']), fixed.bias)
+    assert np.array_equal(parse_arr(defines['CLASSIFIER_FIXED_MULTIPLIER']), fixed.multiplier)
+
+def test_predict_scores():
+    classifier = make_classifier(5, 3)
+    X = np.random.rand(2500, 5) * 100
+    expected = np.c_[ np.ones(2500), classifier.scale_features(X) ] @ classifier.weight
+
+    scores = classifier.predict_scores(X, chunk_rows=1000)
+    assert scores.dtype == np.float32
+    assert np.allclose(scores, expected, rtol=1e-4, atol=1e-4)
+    out = np.empty((2500, 3), dtype=np.float32)
+    assert classifier.predict_scores(X.astype(np.float32), out=out) is out
+    assert np.allclose(out, scores, rtol=1e-5, atol=1e-5)
+
+    predictions = np.empty(2500, dtype=np.intp)
+    assert classifier.predict(X, out=predictions, chunk_rows=300) is predictions
+    assert np.array_equal(predictions, np.argmax(scores, 1))
+    assert classifier.predict(X[:0]).shape == (0,)
+
+def test_predict_many():
+    rng = np.random.RandomState(0)
+    X = rng.normal(5, 3, (1000, 6))
+    classifiers = []
+    for _ in range(3):
+        classifier = LinearClassifier(4, 6, rng.normal(0, 1, (7, 4)))
+        classifier.fit_scaling(rng.normal(5, 3, (100, 6)))
+        classifiers.append(classifier)
+    predictions = predict_many(classifiers, X, chunk_rows=300)
+    assert predictions.shape == (3, 1000)
+    for classifier, prediction in zip(classifiers, predictions):
+        assert np.array_equal(prediction, classifier.predict(X))
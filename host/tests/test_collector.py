@@ -0,0 +1,120 @@
+import os
+import numpy as np
+import pytest
+from poweredarm.collector import (FrameParser, BinaryFrameParser, BlockWriter,
+                                  SerialCollector, encode_frames, FRAME_SIZE,
+                                  FRAME_SYNC)
+from poweredarm.data_processing import collect_from_serial, load_csv
+
+def frame_line(values):
+    return '_DATA_: {} \n'.format(' '.join(str(v) for v in values)).encode()
+
+def test_frame_parser_chunks():
+    data = (b'boot message\n' + frame_line(range(8)) + b'3\n' +
+            frame_line(range(8, 16)) + frame_line(range(16, 24)))
+    parser = FrameParser()
+    # Feed in awkwardly sized chunks, splitting frames apart
+    frames = np.vstack([parser.feed(data[i:i + 7]) for i in range(0, len(data), 7)])
+    assert np.array_equal(frames, np.arange(24).reshape(3, 8))
+    assert parser.frames == 3 and parser.malformed == 0
+
+def test_frame_parser_malformed():
+    parser = FrameParser()
+    frames = parser.feed(b'_DATA_: 1 2 3\n_DATA_: 1 2 3 4 5 6 7 x\n' + frame_line(range(8)))
+    assert np.array_equal(frames, [list(range(8))])
+    assert parser.malformed == 2
+
+@pytest.mark.parametrize('ext', ['.csv', '.npy'])
+def test_block_writer(tmp_path, ext):
+    fname = str(tmp_path / ('data' + ext))
+    frames = np.arange(40).reshape(5, 8)
+    with BlockWriter(fname, 2, block_rows=2) as writer:
+        writer.write(frames[:3, :])
+        writer.write(frames[3:, :])
+
+    data = np.load(fname) if ext == '.npy' else load_csv(fname, cache=False)
+    assert np.array_equal(data, np.c_[ frames, np.full(5, 2) ])
+
+def test_collect_from_replay(tmp_path):
+    log = tmp_path / 'serial.log'
+    log.write_bytes(b''.join(frame_line(range(i, i + 8)) for i in range(100)) + b'_DATA_: 1\n')
+    fname = str(tmp_path / 'rest.csv')
+    counters = collect_from_serial(fname, 0, duration=5, source=str(log))
+    assert counters == {'frames': 100, 'malformed': 1, 'dropped_chunks': 0}
+    data = load_csv(fname, cache=False)
+    assert data.shape == (100, 9)
+    assert np.array_equal(data[:, 0], np.arange(100))
+
+def test_collect_from_pty(tmp_path):
+    master, slave = os.openpty()
+    try:
+        os.write(master, b''.join(frame_line(range(8)) for _ in range(10)))
+        with open(os.ttyname(slave), 'rb', buffering=0) as stream:
+            fname = str(tmp_path / 'grip.csv')
+            with BlockWriter(fname, 2) as writer:
+                collector = SerialCollector(stream, writer)
+                # Collection ends after the duration, since the pty never closes
+                collector.run(0.5)
+        assert collector.counters()['frames'] == 10
+        assert load_csv(fname, cache=False).shape == (10, 9)
+    finally:
+        os.close(master)
+        os.close(slave)
+
+def test_binary_frame_parser_chunks():
+    frames = np.random.randint(0, 65536, (50, 8))
+    data = b'I (1234) boot: text\n' + encode_frames(frames[:20, :]) + b'2\n' + encode_frames(frames[20:, :])
+    parser = BinaryFrameParser()
+    decoded = np.vstack([parser.feed(data[i:i + 33]) for i in range(0, len(data), 33)])
+    assert np.array_equal(decoded, frames)
+    assert parser.frames == 50
+
+def test_binary_frame_parser_checksum():
+    data = bytearray(encode_frames(np.arange(24).reshape(3, 8)))
+    # Corrupt a value of the second frame
+    data[FRAME_SIZE + 4] ^= 1
+    parser = BinaryFrameParser()
+    decoded = parser.feed(bytes(data))
+    assert np.array_equal(decoded, [list(range(8)), list(range(16, 24))])
+    assert parser.malformed == 1
+
+def test_binary_frame_parser_overlapping_sync():
+    # The sync word in the middle of the first frame starts a frame that
+    # passes its checksum, which overlaps both real frames
+    first = [1, 2, 3, 4, 0x5AA5, 6, 7, 8]
+    second = [9, 10, 11, 0, 13, 14, 15, 16]
+    second[3] = (sum(first[5:]) + sum(first) + 0x5AA5 + sum(second[:3])) % 65536
+    data = encode_frames([first, second])
+    parser = BinaryFrameParser()
+    assert np.array_equal(parser.feed(data), [first, second])
+    assert parser.frames == 2
+
+def test_binary_frame_parser_no_overlap():
+    # EMG magnitudes never contain a sync word, so the only candidates are the
+    # real frames, which are all kept at once without comparing them in turn
+    frames = np.random.randint(0, 4096, (2000, 8))
+    data = encode_frames(frames)
+    raw = np.frombuffer(data, dtype=np.uint8)
+    starts = np.flatnonzero((raw[:-1] == FRAME_SYNC[0]) & (raw[1:] == FRAME_SYNC[1]))
+    assert np.all(np.diff(starts) >= FRAME_SIZE)
+
+    parser = BinaryFrameParser()
+    decoded = np.vstack([parser.feed(data[i:i + 4096]) for i in range(0, len(data), 4096)])
+    assert np.array_equal(decoded, frames)
+    assert parser.frames == 2000 and parser.malformed == 0
+
+def test_binary_frames_with_control_bytes():
+    # Newlines and XON/XOFF bytes are valid data in binary frames
+    frames = np.array([[0x0A, 0x11, 0x13, 0x0A0A, 0x1311, 0x130A, 0x0D0A, 17]])
+    data = encode_frames(frames)
+    assert all(byte in data for byte in b'\x0a\x11\x13')
+    assert np.array_equal(BinaryFrameParser().feed(data), frames)
+
+def test_collect_binary_from_replay(tmp_path):
+    log = tmp_path / 'serial.bin'
+    frames = np.random.randint(0, 1000, (100, 8))
+    log.write_bytes(encode_frames(frames))
+    fname = str(tmp_path / 'key.csv')
+    counters = collect_from_serial(fname, 3, duration=5, source=str(log), binary=True)
+    assert counters['frames'] == 100
+    assert np.array_equal(load_csv(fname, cache=False), np.c_[ frames, np.full(100, 3) ])
@@ -0,0 +1,86 @@
+from os import path
+import glob
+import numpy as np
+import pytest
+from poweredarm.collector import BlockWriter
+from poweredarm.data_processing import (aggregate_csv, iter_csv_chunks, load_csv,
+                                         split_indices, gather_batches)
+
+def test_iter_csv_chunks():
+    files = sorted(glob.glob(path.join('tests', 'data', 'dataset', '*.csv')))
+    chunks = list(iter_csv_chunks(files, 100))
+    assert all(X.shape[0] <= 100 and X.shape[0] == y.shape[0] for X, y in chunks)
+
+    data = np.vstack([np.loadtxt(f, delimiter=',', dtype=np.float32) for f in files])
+    assert np.array_equal(np.vstack([X for X, _ in chunks]), data[:, :-1])
+    assert np.array_equal(np.concatenate([y for _, y in chunks]), data[:, -1])
+
+def test_load_csv_cache(tmp_path):
+    fname = str(tmp_path / 'rest.csv')
+    with open(fname, 'w') as file:
+        file.write('1,2,3,0\n4,5,6,0\n')
+
+    fdata = load_csv(fname)
+    assert fdata.dtype == np.int16
+    assert np.array_equal(fdata, [[1, 2, 3, 0], [4, 5, 6, 0]])
+    assert (tmp_path / '.cache' / 'rest.csv.npy').exists()
+    # Loaded from the cache the second time
+    assert isinstance(load_csv(fname), np.memmap)
+
+    # Changing the file invalidates its cache entry
+    with open(fname, 'w') as file:
+        file.write('1,2,3,0\n4,5,6,0\n7,8,9.5,1\n')
+    fdata = load_csv(fname)
+    assert fdata.dtype == np.float32
+    assert np.array_equal(fdata[2, :], [7, 8, 9.5, 1])
+
+def test_aggregate_csv_cache():
+    files = glob.glob(path.join('tests', 'data', 'dataset', '*.csv'))
+    np.random.seed(0)
+    expected = aggregate_csv(files, cache=False)
+    for _ in range(2):
+        np.random.seed(0)
+        assert np.array_equal(aggregate_csv(files), expected)
+
+@pytest.mark.parametrize('stratify', [False, True])
+def test_split_indices(stratify):
+    labels = np.repeat(np.arange(4), [10, 20, 30, 40])
+    train, val, test = split_indices(labels, [0.5, 0.3], seed=1, stratify=stratify)
+    assert (len(train), len(val), len(test)) == (50, 30, 20)
+    # Every row ends up in exactly one chunk
+    assert np.array_equal(np.sort(np.concatenate([train, val, test])), np.arange(100))
+    if stratify:
+        assert np.array_equal(np.bincount(labels[train]), [5, 10, 15, 20])
+        assert np.array_equal(np.bincount(labels[test]), [2, 4, 6, 8])
+
+    again = split_indices(labels, [0.5, 0.3], seed=1, stratify=stratify)
+    assert all(np.array_equal(a, b) for a, b in zip([train, val, test], again))
+
+def test_gather_batches(tmp_path):
+    files = glob.glob(path.join('tests', 'data', 'dataset', '*.csv'))
+    data = aggregate_csv(files, shuffle=False, filename=str(tmp_path / 'data.npy'))
+    assert isinstance(data, np.memmap)
+    indices = np.random.permutation(data.shape[0])[:1000]
+
+    batches = list(gather_batches(data, indices, 300))
+    assert [X.shape[0] for X, _ in batches] == [300, 300, 300, 100]
+    X = np.vstack([X for X, _ in batches])
+    y = np.concatenate([y for _, y in batches])
+    # Batches hold the same rows, although each batch is in sorted order
+    order = np.concatenate([np.sort(indices[i:i + 300]) for i in range(0, 1000, 300)])
+    assert np.array_equal(X, data[order, :-1])
+    assert np.array_equal(y, data[order, -1])
+
+def test_load_npy(tmp_path):
+    csv_file = path.join('tests', 'data', 'dataset', 'Rest_2018-06-23@23-46-44.csv')
+    data = load_csv(csv_file, cache=False)
+    npy_file = str(tmp_path / 'rest.npy')
+    with BlockWriter(npy_file, 0) as writer:
+        writer.write(data[:, :-1])
+
+    assert np.array_equal(load_csv(npy_file), data)
+    assert np.array_equal(aggregate_csv([csv_file, npy_file], shuffle=False),
+                          np.vstack([data, data]))
+    chunks = list(iter_csv_chunks([npy_file], 100))
+    assert np.array_equal(np.vstack([X for X, _ in chunks]), data[:, :-1])
+    assert np.array_equal(np.concatenate([y for _, y in chunks]), data[:, -1])
@@ -0,0 +1,94 @@
+import glob
+import os
+import shutil
+import subprocess
+import sys
+from os import path
+import numpy as np
+import pytest
+from poweredarm import dataset_index
+from poweredarm.classifier import LinearClassifier
+from poweredarm.collector import BlockWriter
+from poweredarm.data_processing import aggregate_csv
+from poweredarm.dataset_index import DatasetIndex
+
+HOST_DIR = path.dirname(path.dirname(path.abspath(__file__)))
+
+@pytest.fixture
+def directory(tmp_path):
+    for fname in glob.glob(path.join('tests', 'data', 'dataset', '*.csv')):
+        shutil.copy(fname, str(tmp_path))
+    return str(tmp_path)
+
+def test_index(directory):
+    index = DatasetIndex(directory).update()
+    index.save()
+    files = index.select()
+    assert len(files) == 4
+    # The gesture comes from the labels, since this old file predates the
+    # current numbering of the gestures
+    entry = index.entries['Grip_2018-06-23@23-45-06.csv']
+    assert entry['gesture'] == 'open' and entry['labels'] == [1]
+    assert entry['session'] == '2018-06-23T23:45:06'
+
+    data = aggregate_csv(files, shuffle=False)
+    assert sum(entry['rows'] for entry in index.entries.values()) == data.shape[0]
+    classifier = LinearClassifier(4, 8)
+    classifier.fit_scaling(data[:, :-1])
+    offset, divisor = index.scaling(files)
+    assert np.allclose(offset, classifier.offset) and np.allclose(divisor, classifier.divisor)
+    assert np.allclose(index.std(files), np.std(data[:, :-1], 0, dtype=np.float64))
+
+    # The saved index is reused without reading the data again
+    assert DatasetIndex(directory).entries == index.entries
+
+def test_select(directory):
+    index = DatasetIndex(directory).update()
+    assert [path.basename(f) for f in index.select(gestures=['rest', 'key'])] == [
+        'Key_2018-06-23@23-44-27.csv', 'Rest_2018-06-23@23-46-44.csv']
+    assert [path.basename(f) for f in index.select(after='2018-06-23T23:46')] == [
+        'Open_2018-06-23@23-46-05.csv', 'Rest_2018-06-23@23-46-44.csv']
+    assert index.select(gestures=['rest'], before='2018-06-23T23:46') == []
+
+def test_incremental_update(directory, monkeypatch):
+    DatasetIndex(directory).update().save()
+    index = DatasetIndex(directory)
+
+    loaded = []
+    load_csv = dataset_index.load_csv
+    monkeypatch.setattr(dataset_index, 'load_csv', lambda fname: loaded.append(fname) or load_csv(fname))
+    fname = path.join(directory, 'Rest_2018-06-23@23-46-44.csv')
+    with open(fname, 'a') as file:
+        file.write('1,2,3,4,5,6,7,8,0\n')
+    shutil.copy(fname, path.join(directory, 'rest-2019-05-26-11-48-33.csv'))
+    index.update()
+    # Only the changed and new files are read
+    assert sorted(path.basename(f) for f in loaded) == [
+        'Rest_2018-06-23@23-46-44.csv', 'rest-2019-05-26-11-48-33.csv']
+    assert index.entries['rest-2019-05-26-11-48-33.csv']['session'] == '2019-05-26T11:48:33'
+
+def test_train_query_matches_files(tmp_path):
+    # Training on files selected by a query gives the same classifier as
+    # passing the same files, so the second run reuses the first's
+    dataset = tmp_path / 'data' / 'dataset'
+    shutil.copytree(path.join('tests', 'data', 'dataset'), str(dataset))
+    files = DatasetIndex(str(dataset)).update().select()
+    env = dict(os.environ, PYTHONPATH=HOST_DIR, MPLBACKEND='Agg')
+    outputs = [subprocess.run([sys.executable, '-m', 'run', 'train', '--seed=0'] + args,
+                              cwd=str(tmp_path), env=env, check=True, stdout=subprocess.PIPE,
+                              universal_newlines=True).stdout
+               for args in [[path.relpath(f, str(tmp_path)) for f in files], ['--after=2018-01-01']]]
+    assert 'Reuse classifier' not in outputs[0]
+    assert 'Reuse classifier' in outputs[1]
+
+def test_index_npy(directory):
+    data = aggregate_csv(DatasetIndex(directory).update().select(['rest']), shuffle=False)
+    with BlockWriter(path.join(directory, 'rest-2019-05-26-11-48-56.npy'), 0) as writer:
+        writer.write(data[:, :-1])
+    # Timestamps saved by the collector aren't data
+    np.save(path.join(directory, 'rest-2019-05-26-11-48-56.npy.times.npy'), np.zeros(3))
+
+    index = DatasetIndex(directory).update()
+    files = index.select(['rest'], after='2019-01-01')
+    assert [path.basename(f) for f in files] == ['rest-2019-05-26-11-48-56.npy']
+    assert index.entries[path.basename(files[0])]['rows'] == data.shape[0]
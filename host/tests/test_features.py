@@ -0,0 +1,103 @@
+from os import path
+import glob
+import numpy as np
+import pytest
+from poweredarm.classifier import LinearClassifier
+from poweredarm.data_processing import aggregate_csv
+from poweredarm.features import FeatureExtractor
+from poweredarm.live import predict_live
+from poweredarm.train_classifier import train_linear_classifier, evaluate_linear_classifier
+
+def naive_features(X, window):
+    # Straightforward definitions of each feature, one window at a time
+    rows = []
+    for end in range(window, X.shape[0] + 1):
+        w = X[end - window:end, :]
+        diff = np.diff(w, axis=0)
+        rows.append(np.concatenate([
+            np.mean(np.abs(w), 0),
+            np.sqrt(np.mean(w * w, 0)),
+            np.sum(np.abs(diff), 0),
+            np.sum(diff[:-1, :] * -diff[1:, :] > 0, 0),
+        ]))
+    return np.array(rows)
+
+@pytest.mark.parametrize('window', [3, 4, 10])
+def test_transform(window):
+    X = np.random.randint(0, 1000, (50, 3))
+    extractor = FeatureExtractor(window)
+    features = extractor.transform(X)
+    assert features.shape == (50 - window + 1, 12)
+    assert np.allclose(features, naive_features(X, window))
+
+def test_transform_subset():
+    X = np.random.randint(0, 1000, (20, 2))
+    features = FeatureExtractor(5, kinds=('ssc', 'mav')).transform(X)
+    expected = naive_features(X, 5)
+    # Kinds are always output in the same order
+    assert np.allclose(features, expected[:, [0, 1, 6, 7]])
+
+def test_transform_short():
+    assert FeatureExtractor(5).transform(np.ones((4, 8))).shape == (0, 32)
+
+def test_transform_data():
+    data = np.c_[ np.random.randint(0, 1000, (10, 2)), np.arange(10) ]
+    transformed = FeatureExtractor(4).transform_data(data)
+    assert transformed.shape == (7, 9)
+    # Each window is labelled with its last sample
+    assert np.array_equal(transformed[:, -1], np.arange(3, 10))
+
+def test_stream():
+    X = np.random.randint(0, 1000, (40, 8))
+    extractor = FeatureExtractor(6)
+    stream = extractor.stream(8)
+    outputs = [stream.push(x) for x in X]
+    assert all(output is None for output in outputs[:5])
+    assert np.array_equal(np.array(outputs[5:]), extractor.transform(X))
+
+@pytest.mark.train
+def test_train_classifier_on_features():
+    files = path.join('tests', 'data', 'dataset', '*.csv')
+    acc, recalls = train_linear_classifier(glob.glob(files), seed=0,
+                                           features=FeatureExtractor(5))
+    assert acc > 0.992 and (recalls > 0.975).all()
+
+def windowed_classifier(extractor, files):
+    data = aggregate_csv(files, shuffle=False, transform=extractor.transform_data)
+    classifier = LinearClassifier(4, data.shape[1] - 1)
+    classifier.features = extractor
+    classifier.train(data[:, :-1], data[:, -1], optimizer='newton', num_iter=10)
+    return classifier, data
+
+def test_windowed_classifier_save_load(tmp_path):
+    files = sorted(glob.glob(path.join('tests', 'data', 'dataset', '*.csv')))
+    classifier, data = windowed_classifier(FeatureExtractor(4, ['mav', 'wl']), files)
+    fname = str(tmp_path / 'classifier.npz')
+    classifier.save(fname)
+
+    loaded = LinearClassifier.load(fname)
+    assert loaded.features.window == 4 and loaded.features.kinds == ('mav', 'wl')
+    assert LinearClassifier.load(path.join('tests', 'data', 'classifiers', 'classifier.npz')).features is None
+
+    # The header configures the target's feature extraction without being told
+    header = tmp_path / 'classifier.h'
+    loaded.to_header(fname, str(header))
+    text = header.read_text()
+    assert '#define FEATURES_WINDOW 4\n' in text and '#define FEATURES_WL 1\n' in text
+    assert 'FEATURES_RMS' not in text
+
+    # Evaluation computes the same features from the raw data
+    acc, recalls = classifier.evaluate(data[:, :-1], data[:, -1])
+    confusion = evaluate_linear_classifier(fname, files)
+    assert np.isclose(confusion.accuracy_recall()[0], acc)
+
+def test_predict_live_windowed():
+    X = np.random.randint(0, 1000, (50, 8))
+    classifier, _ = windowed_classifier(
+        FeatureExtractor(5), sorted(glob.glob(path.join('tests', 'data', 'dataset', '*.csv'))))
+    emitted = []
+    stats = predict_live(classifier, iter(X), emitted.append, window=4)
+    # No predictions until the first window is complete
+    assert stats.count == 46
+    assert np.array_equal(np.concatenate(emitted),
+                          classifier.predict(classifier.features.transform(X)))
@@ -0,0 +1,82 @@
+import os
+from itertools import islice
+import numpy as np
+import pytest
+from poweredarm.collector import encode_frames
+from poweredarm.classifier import LinearClassifier
+from poweredarm.data_processing import open_source, read_samples
+from poweredarm.live import RingBuffer, LatencyStats, predict_live
+
+LOG = (b'I (123) boot: ESP-IDF\n' +
+       b'_DATA_: 1 2 3 4 5 6 7 8 \n' +
+       b'2\n' +
+       b'_DATA_: 9 10 11 12 13 14 15 16 \n')
+
+def test_ring_buffer():
+    buffer = RingBuffer(3, 2)
+    for i in range(2):
+        buffer.push([i, i])
+    assert np.array_equal(buffer.pop_all(), [[0, 0], [1, 1]])
+    assert len(buffer) == 0
+
+    # Overflowing drops the oldest rows
+    for i in range(5):
+        buffer.push([i, -i])
+    assert buffer.dropped == 2
+    assert np.array_equal(buffer.pop_all(), [[2, -2], [3, -3], [4, -4]])
+
+def test_latency_stats():
+    stats = LatencyStats(history=2)
+    stats.add(np.array([0.001, 0.003]))
+    stats.add(np.array([0.002]))
+    summary = stats.summary()
+    assert summary['samples'] == 3
+    assert np.isclose(summary['mean_ms'], 2)
+    assert np.isclose(summary['max_ms'], 3)
+    # Percentiles only cover the 2 most recent samples
+    assert np.isclose(summary['p50_ms'], 2.5)
+
+def test_read_samples_replay(tmp_path):
+    log = tmp_path / 'serial.log'
+    log.write_bytes(LOG)
+    with open_source(str(log)) as stream:
+        samples = list(read_samples(stream))
+    assert np.array_equal(samples, [list(range(1, 9)), list(range(9, 17))])
+
+def test_read_samples_pty():
+    master, slave = os.openpty()
+    try:
+        with open_source(os.ttyname(slave)) as stream:
+            os.write(master, LOG)
+            samples = list(islice(read_samples(stream), 2))
+        assert np.array_equal(samples, [list(range(1, 9)), list(range(9, 17))])
+    finally:
+        os.close(master)
+        os.close(slave)
+
+def test_read_binary_samples_pty():
+    # Bytes that flow control or line ending translation would mangle
+    frames = np.array([[0x0A, 0x11, 0x13, 0x0A0A, 0x1311, 0x130A, 0x0D0A, 17]] * 3)
+    master, slave = os.openpty()
+    try:
+        with open_source(os.ttyname(slave), timeout=1, binary=True) as stream:
+            os.write(master, encode_frames(frames))
+            samples = list(islice(read_samples(stream, binary=True), 3))
+        assert np.array_equal(samples, frames)
+    finally:
+        os.close(master)
+        os.close(slave)
+
+@pytest.mark.parametrize('window', [1, 3, 8])
+def test_predict_live(window):
+    weight = np.random.rand(3, 4)
+    classifier = LinearClassifier(num_classes=4, num_features=2, init_weight=weight)
+    classifier.offset = np.zeros(2)
+    classifier.divisor = np.ones(2)
+    X = np.random.rand(20, 2)
+
+    batches = []
+    stats = predict_live(classifier, iter(X), batches.append, window)
+    assert all(len(batch) <= window for batch in batches)
+    assert np.array_equal(np.concatenate(batches), classifier.predict(X))
+    assert stats.count == 20
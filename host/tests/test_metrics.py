@@ -0,0 +1,66 @@
+import numpy as np
+from poweredarm.classifier import LinearClassifier
+from poweredarm.metrics import (confusion_matrix, accuracy_recall, precision_recall_f1,
+                                ConfusionMatrix)
+
+def test_confusion_matrix():
+    y = np.array([0, 0, 1, 1, 1, 2])
+    predictions = np.array([0, 1, 1, 1, 0, 0])
+    confusion = confusion_matrix(y, predictions, 4)
+    assert np.array_equal(confusion, [[1, 1, 0, 0],
+                                      [1, 2, 0, 0],
+                                      [1, 0, 0, 0],
+                                      [0, 0, 0, 0]])
+    accuracy, recall = accuracy_recall(confusion)
+    assert accuracy == 0.5
+    assert np.allclose(recall, [0.5, 2 / 3, 0, -1])
+
+def test_stacked_confusion_matrices():
+    rng = np.random.RandomState(0)
+    y = rng.randint(0, 3, 500)
+    predictions = rng.randint(0, 3, (4, 500))
+    confusion = confusion_matrix(y, predictions, 3)
+    assert confusion.shape == (4, 3, 3)
+    for matrix, prediction in zip(confusion, predictions):
+        assert np.array_equal(matrix, confusion_matrix(y, prediction, 3))
+    accuracy, recall = accuracy_recall(confusion)
+    assert np.allclose(accuracy, np.mean(predictions == y, 1))
+
+def test_precision_recall_f1():
+    # Class 2 is never predicted correctly, and class 3 is never seen or predicted
+    confusion = np.array([[3, 1, 0, 0],
+                          [1, 2, 1, 0],
+                          [2, 0, 0, 0],
+                          [0, 0, 0, 0]])
+    precision, recall, f1, support = precision_recall_f1(confusion)
+    assert np.allclose(precision, [0.5, 2 / 3, 0, -1])
+    assert np.allclose(recall, [0.75, 0.5, 0, -1])
+    assert np.allclose(f1, [0.6, 4 / 7, 0, -1])
+    assert np.array_equal(support, [4, 4, 2, 0])
+
+def test_confusion_matrix_update():
+    rng = np.random.RandomState(0)
+    y = rng.randint(0, 4, 1000)
+    predictions = rng.randint(0, 4, 1000)
+    confusion = ConfusionMatrix(4)
+    # Uneven chunks, including an empty one
+    for start, end in [(0, 0), (0, 300), (300, 301), (301, 750), (750, 1000)]:
+        confusion.update(y[start:end], predictions[start:end])
+    assert np.array_equal(confusion.matrix, confusion_matrix(y, predictions, 4))
+    assert np.allclose(confusion.precision_recall_f1(),
+                       precision_recall_f1(confusion_matrix(y, predictions, 4)))
+
+def test_accumulated_confusion():
+    rng = np.random.RandomState(0)
+    X = rng.normal(0, 1, (1000, 3))
+    y = rng.randint(0, 4, 1000)
+    classifier = LinearClassifier(4, 3, rng.normal(0, 1, (4, 4)))
+    classifier.fit_scaling(X)
+
+    chunks = [(X[i:i + 128], y[i:i + 128]) for i in range(0, 1000, 128)]
+    confusion = classifier.confusion(chunks)
+    assert np.array_equal(confusion.matrix, confusion_matrix(y, classifier.predict(X), 4))
+    acc, recalls = confusion.accuracy_recall()
+    expected_acc, expected_recalls = classifier.evaluate(X, y)
+    assert acc == expected_acc and np.array_equal(recalls, expected_recalls)
+    assert 'Precision' in confusion.report()
@@ -0,0 +1,25 @@
+import numpy as np
+from poweredarm.parallel import run_parallel
+
+def sample_rows(data, rng, scale):
+    # Depends on the shared data, the job's random stream and its arguments
+    return scale * data[rng.randint(data.shape[0]), :]
+
+def test_run_parallel_matches_serial():
+    data = np.arange(60, dtype=np.float32).reshape(20, 3)
+    jobs = [(i,) for i in range(6)]
+    serial = run_parallel(sample_rows, data, jobs, seed=3, max_workers=1)
+    parallel = run_parallel(sample_rows, data, jobs, seed=3, max_workers=2)
+    assert len(parallel) == len(jobs)
+    for i, (expected, result) in enumerate(zip(serial, parallel)):
+        assert np.array_equal(expected, result)
+        # Results come back in job order, so each is scaled by its index
+        assert (result == i * data).all(1).any()
+
+def test_run_parallel_job_seeds():
+    data = np.arange(1000, dtype=np.float32).reshape(-1, 1)
+    results = run_parallel(sample_rows, data, [(1,)] * 4, seed=5, max_workers=2)
+    # Each job should have a different random stream
+    assert len(set(float(r[0]) for r in results)) == 4
+    again = run_parallel(sample_rows, data, [(1,)] * 4, seed=5, max_workers=2)
+    assert np.array_equal(results, again)
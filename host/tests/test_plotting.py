@@ -0,0 +1,43 @@
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pytest
+from os import path
+from poweredarm.data_processing import graph_csv, graph_relationships_csv
+from poweredarm.plotting import count_rows, minmax_envelope, reservoir_sample
+
+DATA_FILE = path.join(path.dirname(__file__), 'data', 'dataset', 'Grip_2018-06-23@23-45-06.csv')
+
+@pytest.mark.parametrize('chunk_rows', [7, 64, 1000])
+def test_minmax_envelope(chunk_rows):
+    data = np.random.default_rng(0).normal(size=(1003, 3))
+    chunks = (data[i:i + chunk_rows] for i in range(0, data.shape[0], chunk_rows))
+    x, lower, upper = minmax_envelope(chunks, data.shape[0], 100)
+    # 11 samples to a bucket, with the last one holding the 2 left over
+    assert np.array_equal(x, np.arange(92) * 11)
+    for n, start in enumerate(x):
+        assert np.array_equal(lower[n], data[start:start + 11].min(0))
+        assert np.array_equal(upper[n], data[start:start + 11].max(0))
+
+def test_reservoir_sample():
+    data = np.arange(10000).reshape(-1, 1)
+    chunks = (data[i:i + 300] for i in range(0, data.shape[0], 300))
+    sample = reservoir_sample(chunks, 500, np.random.default_rng(0))
+    assert sample.shape == (500, 1)
+    assert len(np.unique(sample)) == 500
+    # Rows from the end are as likely to be picked as rows from the start
+    assert 0.4 < np.mean(sample < 5000) < 0.6
+    assert np.array_equal(reservoir_sample([data[:10]], 500, np.random.default_rng(0)), data[:10])
+
+def test_graph_csv():
+    rows = count_rows(DATA_FILE)
+    assert rows == np.loadtxt(DATA_FILE, delimiter=',', ndmin=2).shape[0]
+    fig = graph_csv(DATA_FILE, chunk_rows=100, show=False)
+    lines = fig.axes[0].get_lines()
+    assert len(lines) == 8
+    # Two points a pixel at most, instead of one a sample
+    assert len(lines[0].get_xdata()) <= 2 * fig.axes[0].bbox.width + 2
+
+def test_graph_relationships_csv():
+    fig = graph_relationships_csv(DATA_FILE, max_points=100, seed=0, show=False)
+    assert len(fig.axes) == 64
@@ -0,0 +1,41 @@
+import json
+from poweredarm import profiling
+from poweredarm.benchmark import synthetic_data, write_synthetic_csvs
+from poweredarm.classifier import LinearClassifier
+from poweredarm.data_processing import aggregate_csv
+
+def test_disabled():
+    assert profiling.active() is None
+    with profiling.phase('unused'):
+        pass
+    profiling.count('unused')
+    assert profiling.timed('unused')(lambda x: x + 1)(1) == 2
+
+def test_phases(tmp_path):
+    files = write_synthetic_csvs(str(tmp_path), 2, 100)
+    data = synthetic_data(1000, 8, 4)
+    profiler = profiling.Profiler(every=30, use_tracemalloc=True)
+    profiling.enable(profiler)
+    try:
+        aggregate_csv(files, cache=False)
+        classifier = LinearClassifier(4, 8)
+        classifier.train(data[:, :-1], data[:, -1], rate=0.001, num_iter=100)
+        classifier.evaluate(data[:, :-1], data[:, -1])
+        classifier.save(str(tmp_path / 'classifier.npz'))
+    finally:
+        profiling.disable()
+    assert profiling.active() is None
+
+    assert profiler.phases['gradient descent iterations'][0] == 100
+    for name in ['aggregate_csv', 'train', 'evaluate', 'save']:
+        assert profiler.phases[name][0] == 1
+    assert profiler.counters == {'csv files parsed': 2, 'rows loaded': 200}
+    assert profiler.peak_memory > 0
+    assert 'aggregate_csv' in profiler.summary()
+
+    fname = str(tmp_path / 'profile.json')
+    profiler.save(fname)
+    with open(fname) as file:
+        saved = json.load(file)
+    assert saved['phases']['train']['calls'] == 1
+    assert saved['counters']['rows loaded'] == 200
@@ -0,0 +1,68 @@
+import glob
+import os
+import shutil
+from os import path
+import numpy as np
+from poweredarm.classifier import LinearClassifier
+from poweredarm.registry import ModelRegistry
+from poweredarm.train_classifier import train_linear_classifier
+
+def test_key(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    files = sorted(glob.glob(path.join('tests', 'data', 'dataset', '*.csv')))
+    dataset = registry.dataset_hash(files)
+    assert dataset == registry.dataset_hash(files)
+    assert dataset != registry.dataset_hash(files[::-1])
+    assert registry.key(dataset, {'seed': 1, 'a': 2}) == registry.key(dataset, {'a': 2, 'seed': 1})
+    assert registry.key(dataset, {'seed': 1}) != registry.key(dataset, {'seed': 2})
+
+def test_put_get_evict(tmp_path):
+    registry = ModelRegistry(str(tmp_path), max_models=2)
+    classifier = LinearClassifier(4, 8)
+    classifier.fit_scaling(np.random.rand(10, 8))
+    # Saved by hand, so never evicted
+    classifier.save(str(tmp_path / 'lin-cls-50-2019-05-26-11-48-56.npz'))
+
+    assert registry.get('0' * 16) is None
+    for i in range(3):
+        registry.put(str(i) * 16, classifier, {'accuracy': 0.5})
+        # Use the first model again, so that the second is the least recent
+        assert registry.get('0' * 16)[0] == classifier
+    assert registry.get('1' * 16) is None
+    assert registry.get('2' * 16)[1]['accuracy'] == 0.5
+    assert len(os.listdir(str(tmp_path))) == 5
+
+    registry.max_bytes = 1
+    registry.evict()
+    assert os.listdir(str(tmp_path)) == ['lin-cls-50-2019-05-26-11-48-56.npz']
+
+def test_train_reuses_model(tmp_path, monkeypatch):
+    registry = ModelRegistry(str(tmp_path))
+    files = sorted(glob.glob(path.join('tests', 'data', 'dataset', '*.csv')))
+    acc, recalls = train_linear_classifier(files, seed=0, registry=registry)
+    assert len(glob.glob(str(tmp_path / '*.npz'))) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError('retrained')
+    monkeypatch.setattr(LinearClassifier, 'train', fail)
+    cached_acc, cached_recalls = train_linear_classifier(files, seed=0, registry=registry)
+    assert cached_acc == acc and np.array_equal(cached_recalls, recalls)
+
+    # Changing the data misses the cache
+    shutil.copy(files[0], str(tmp_path / 'data.csv'))
+    with open(str(tmp_path / 'data.csv'), 'a') as file:
+        file.write('1,2,3,4,5,6,7,8,0\n')
+    monkeypatch.undo()
+    train_linear_classifier([str(tmp_path / 'data.csv')] + files[1:], seed=0, registry=registry)
+    assert len(glob.glob(str(tmp_path / '*.npz'))) == 2
+
+def test_train_key_covers_optimizer(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    files = sorted(glob.glob(path.join('tests', 'data', 'dataset', '*.csv')))
+    runs = [('newton', {}), ('newton', {'num_iter': 50}), ('newton', {'num_iter': 5}),
+            ('gradient_descent', {'rate': 0.001, 'num_iter': 5})]
+    for optimizer, args in runs:
+        train_linear_classifier(files, seed=0, registry=registry, optimizer=optimizer,
+                                optimizer_args=args)
+    # Passing the default number of iterations reuses the first classifier
+    assert len(glob.glob(str(tmp_path / '*.npz'))) == 3
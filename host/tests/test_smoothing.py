@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from poweredarm.classifier import LinearClassifier
+from poweredarm.smoothing import (PredictionSmoother, smooth_predictions,
+                                  decision_latencies, smoothing_stats)
+
+@pytest.mark.parametrize('window,min_votes', [(1, None), (4, None), (8, 6), (9, 9)])
+def test_smooth_predictions_matches_stream(window, min_votes):
+    # Mostly runs of one class with noisy predictions of the others
+    rng = np.random.default_rng(0)
+    y = np.repeat(rng.integers(0, 4, 20), 50)
+    predictions = np.where(rng.random(y.shape[0]) < 0.3, rng.integers(0, 4, y.shape[0]), y)
+
+    smoother = PredictionSmoother(4, window, min_votes)
+    assert np.array_equal(smoother.push_many(predictions),
+                          smooth_predictions(predictions, 4, window, min_votes))
+
+def test_smoother_hysteresis():
+    smoother = PredictionSmoother(4, window=4, min_votes=3)
+    # Holds the initial class until another has 3 of the last 4 votes
+    assert list(smoother.push_many([2, 1, 2, 1, 2, 2, 1, 1, 3, 1, 1])) == [0, 0, 0, 0, 0, 2, 2, 2, 2, 1, 1]
+
+def test_decision_latencies():
+    y = np.array([0, 0, 1, 1, 1, 2, 2, 0])
+    smoothed = np.array([0, 0, 0, 1, 1, 1, 1, 0])
+    assert list(decision_latencies(y, smoothed)) == [1, -1, 0]
+
+def test_smoothing_stats():
+    y = np.repeat([0, 1, 2, 3], 100)
+    predictions = y.copy()
+    predictions[::5] = 3
+    raw = smoothing_stats(y, predictions, 4, 1)
+    smoothed = smoothing_stats(y, predictions, 4, 5)
+    assert raw['switches_per_1000'] > smoothed['switches_per_1000']
+    assert smoothed['accuracy'] > raw['accuracy']
+    assert smoothed['mean_latency'] >= raw['mean_latency'] and smoothed['missed'] == 0
+
+def test_smoothing_header(tmp_path):
+    classifier = LinearClassifier(4, 8)
+    classifier.fit_scaling(np.arange(16).reshape(2, 8))
+    header = tmp_path / 'classifier.h'
+    classifier.to_header('classifier.npz', str(header), smoothing=PredictionSmoother(4, 16, 12))
+    text = header.read_text()
+    assert '#define SMOOTHING_WINDOW 16\n' in text and '#define SMOOTHING_MIN_VOTES 12\n' in text
@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+from os import path
+
+HOST_DIR = path.dirname(path.dirname(path.abspath(__file__)))
+CLASSIFIER = path.join(HOST_DIR, 'tests', 'data', 'classifiers', 'classifier.npz')
+
+# Runs a command of the CLI, then prints which of the heavy modules got imported,
+# including the profilers, which are only needed with --profile options
+SCRIPT = '''
+import runpy, sys
+sys.argv = ['run'] + sys.argv[1:]
+runpy.run_module('run', run_name='__main__')
+print(sorted(name for name in ('matplotlib', 'serial', 'cProfile', 'pstats', 'tracemalloc')
+             if name in sys.modules))
+'''
+
+def imported_modules(tmp_path, *args):
+    output = subprocess.run([sys.executable, '-c', SCRIPT] + list(args), cwd=str(tmp_path),
+                            env=dict(os.environ, PYTHONPATH=HOST_DIR), check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return output.splitlines()[-1]
+
+def test_header_startup(tmp_path):
+    assert imported_modules(tmp_path, 'header', CLASSIFIER) == '[]'
+    assert path.isfile(str(tmp_path / 'out' / 'classifier.h'))
@@ -2,13 +2,94 @@ from os import path
 import glob
 import numpy as np
 import pytest
-from poweredarm.train_classifier import train_linear_classifier
+from poweredarm.classifier import LinearClassifier
+from poweredarm.data_processing import aggregate_csv, create_dataset
+from poweredarm.train_classifier import (train_linear_classifier,
+                                         learning_curve, geometric_sizes,
+                                         repeat_training, evaluate_classifiers,
+                                         evaluate_smoothing)
+from poweredarm.registry import ModelRegistry
+from poweredarm.util import NUM_CLASSES, NUM_FEATURES
 
 @pytest.mark.train
-# Run multiple times, since each run uses different training/test data
-@pytest.mark.parametrize('execution_num', range(5))
-def test_train_classifier_on_data(execution_num):
+def test_train_classifier_on_data():
     # Train classifier on actual data and expect high accuracy
     files = path.join('tests', 'data', 'dataset', '*.csv')
     acc, recalls = train_linear_classifier(glob.glob(files))
     assert acc > 0.992 and (recalls > 0.975).all()
+
+@pytest.mark.train
+def test_repeat_training_on_data():
+    # Run multiple times in parallel, since each run uses different training/test data
+    files = path.join('tests', 'data', 'dataset', '*.csv')
+    for acc, recalls in repeat_training(glob.glob(files), 5, seed=0, max_workers=2):
+        assert acc > 0.992 and (recalls > 0.975).all()
+
+def test_learning_curve():
+    files = path.join('tests', 'data', 'dataset', '*.csv')
+    data = aggregate_csv(glob.glob(files))
+    X, y, Xtest, ytest = create_dataset(data, [0.8])
+    sizes = geometric_sizes(6, 200, 8)
+    accs = learning_curve(X, y, Xtest, ytest, sizes, rate=0.001, num_iter=20)
+
+    # Compare against retraining a single classifier on each prefix
+    classifier = LinearClassifier(num_classes=NUM_CLASSES, num_features=NUM_FEATURES)
+    for size, (acc_train, acc_test) in zip(sizes, accs):
+        classifier.train(X[:size, :], y[:size], rate=0.001, num_iter=20)
+        assert np.isclose(acc_train, classifier.evaluate(X[:size, :], y[:size])[0])
+        assert np.isclose(acc_test, classifier.evaluate(Xtest, ytest)[0])
+
+@pytest.mark.train
+def test_train_classifier_in_batches():
+    files = path.join('tests', 'data', 'dataset', '*.csv')
+    acc, recalls = train_linear_classifier(glob.glob(files), seed=0, stratify=True,
+                                           batch_size=64)
+    assert acc > 0.99 and (recalls > 0.975).all()
+
+def test_train_classifier_in_batches_schedule(tmp_path):
+    files = sorted(glob.glob(path.join('tests', 'data', 'dataset', '*.csv')))
+    registry = ModelRegistry(str(tmp_path))
+    for num_epochs in [1, 2, 2]:
+        train_linear_classifier(files, seed=0, batch_size=64, num_epochs=num_epochs,
+                                rate=5, decay=0.5, registry=registry)
+    # Only the second run with 2 epochs reused a classifier
+    assert len(glob.glob(str(tmp_path / '*.npz'))) == 2
+
+def test_evaluate_classifiers(tmp_path):
+    files = sorted(glob.glob(path.join('tests', 'data', 'dataset', '*.csv')))
+    data = aggregate_csv(files, shuffle=False)
+    classifier_files = []
+    for i, num_iter in enumerate([1, 20]):
+        classifier = LinearClassifier(NUM_CLASSES, NUM_FEATURES)
+        classifier.train(data[:, :-1], data[:, -1], optimizer='newton', num_iter=num_iter)
+        classifier_files.append(str(tmp_path / 'classifier-{}.npz'.format(i)))
+        classifier.save(classifier_files[-1])
+    # Trained on windowed features, so it doesn't fit the raw data
+    windowed = LinearClassifier(NUM_CLASSES, 2 * NUM_FEATURES)
+    windowed.fit_scaling(np.ones((2, 2 * NUM_FEATURES)))
+    windowed.save(str(tmp_path / 'windowed.npz'))
+
+    results, skipped = evaluate_classifiers(
+        classifier_files + [str(tmp_path / 'windowed.npz')], files, max_workers=2)
+    assert skipped == [str(tmp_path / 'windowed.npz')]
+    assert [result['classifier'] for result in results] == classifier_files[::-1]
+    for result in results:
+        acc, recalls = LinearClassifier.load(result['classifier']).evaluate(
+            data[:, :-1], data[:, -1])
+        assert np.isclose(result['accuracy'], acc)
+        assert np.allclose(result['recalls'], recalls)
+        assert result['confusion'].sum() == data.shape[0]
+
+def test_evaluate_smoothing(tmp_path):
+    files = sorted(glob.glob(path.join('tests', 'data', 'dataset', '*.csv')))
+    data = aggregate_csv(files, shuffle=False)
+    classifier = LinearClassifier(NUM_CLASSES, NUM_FEATURES)
+    classifier.train(data[:, :-1], data[:, -1], optimizer='newton', num_iter=20)
+    classifier.save(str(tmp_path / 'classifier.npz'))
+
+    results = evaluate_smoothing(str(tmp_path / 'classifier.npz'), files, [1, 16], chunk_rows=100)
+    assert [result['window'] for result in results] == [1, 16]
+    assert [result['min_votes'] for result in results] == [1, 9]
+    # A window of 1 doesn't smooth anything
+    assert np.isclose(results[0]['accuracy'], classifier.evaluate(data[:, :-1], data[:, -1])[0])
+    assert results[1]['switches_per_1000'] <= results[0]['switches_per_1000']
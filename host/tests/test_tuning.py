@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from poweredarm.benchmark import synthetic_data
+from poweredarm.tuning import (grid_configs, random_configs, cross_validate, best_config,
+                               train_best)
+
+GRID = {'rate': [0.001, 100.], 'num_iter': [50, 200], 'l2': [0., 0.1]}
+
+def test_configs():
+    configs = grid_configs(GRID)
+    assert len(configs) == 8
+    assert {'rate': 0.001, 'num_iter': 200, 'l2': 0.1} in configs
+    sampled = random_configs(GRID, 3, np.random.RandomState(0))
+    assert len(sampled) == 3 and all(config in configs for config in sampled)
+    assert random_configs(GRID, 20, np.random.RandomState(0)) == configs
+
+def test_cross_validate():
+    data = synthetic_data(600, 8, 4)
+    ranked = cross_validate(data, grid_configs(GRID), 3, seed=0, max_workers=2)
+    assert len(ranked) == 8
+    accs = np.array([acc for _, acc in ranked])
+    # A huge rate with a penalty diverges, so it's stopped and ranked last
+    assert np.isnan(accs[-2:]).all()
+    assert all(config['rate'] == 100. and config['l2'] == 0.1 for config, _ in ranked[-2:])
+    assert accs[0] > 0.95 and np.all(np.diff(accs[:-2]) <= 0)
+
+    classifier = train_best(data, ranked)
+    acc, _ = classifier.evaluate(data[:, :-1], data[:, -1])
+    assert acc > 0.95
+
+def test_best_config_skips_diverged():
+    ranked = [({'rate': 1}, np.nan), ({'rate': 2}, 0.5), ({'rate': 3}, 0.9), ({'rate': 4}, np.nan)]
+    assert best_config(ranked) == ({'rate': 3}, 0.9)
+    with pytest.raises(ValueError):
+        best_config([({'rate': 1}, np.nan)])
@@ -0,0 +1,91 @@
+#include <math.h>
+#include <stddef.h>
+#include "emg_features.h"
+
+#ifdef FEATURES_WINDOW
+
+// Sum of the last `length` values pushed for each channel, kept up to date in
+// O(1) per sample. Doubles keep the sums exact for integer EMG values, like
+// the Python code.
+typedef struct {
+    double values[FEATURES_WINDOW][FEATURES_NUM_CHANNELS];
+    double sum[FEATURES_NUM_CHANNELS];
+    size_t pos;
+    size_t length;
+} running_sum_t;
+
+static void running_sum_push(running_sum_t *rs, const double value[])
+{
+    for (size_t ch = 0; ch < FEATURES_NUM_CHANNELS; ch++) {
+        rs->sum[ch] += value[ch] - rs->values[rs->pos][ch];
+        rs->values[rs->pos][ch] = value[ch];
+    }
+    rs->pos = (rs->pos + 1) % rs->length;
+}
+
+static running_sum_t abs_sum = { .length = FEATURES_WINDOW };
+static running_sum_t sq_sum = { .length = FEATURES_WINDOW };
+static running_sum_t wl_sum = { .length = FEATURES_WINDOW - 1 };
+static running_sum_t ssc_sum = { .length = FEATURES_WINDOW - 2 };
+
+static size_t count = 0;
+static double prev[FEATURES_NUM_CHANNELS];
+static double prev_diff[FEATURES_NUM_CHANNELS];
+
+int features_push(const float sample[], float out[])
+{
+    double abs_x[FEATURES_NUM_CHANNELS], sq_x[FEATURES_NUM_CHANNELS];
+    double abs_diff[FEATURES_NUM_CHANNELS], change[FEATURES_NUM_CHANNELS];
+
+    for (size_t ch = 0; ch < FEATURES_NUM_CHANNELS; ch++) {
+        double x = sample[ch];
+        double diff = x - prev[ch];
+        abs_x[ch] = fabs(x);
+        sq_x[ch] = x * x;
+        abs_diff[ch] = fabs(diff);
+        // Whether the previous sample was a peak or valley
+        change[ch] = prev_diff[ch] * -diff > 0 ? 1 : 0;
+        prev_diff[ch] = diff;
+        prev[ch] = x;
+    }
+
+    running_sum_push(&abs_sum, abs_x);
+    running_sum_push(&sq_sum, sq_x);
+    if (count >= 1) {
+        running_sum_push(&wl_sum, abs_diff);
+    }
+    if (count >= 2) {
+        running_sum_push(&ssc_sum, change);
+    }
+    count++;
+
+    if (count < FEATURES_WINDOW) {
+        return 0;
+    }
+
+    // Features are grouped by kind, in the same order as the Python code
+    size_t f = 0;
+#ifdef FEATURES_MAV
+    for (size_t ch = 0; ch < FEATURES_NUM_CHANNELS; ch++) {
+        out[f++] = abs_sum.sum[ch] / FEATURES_WINDOW;
+    }
+#endif
+#ifdef FEATURES_RMS
+    for (size_t ch = 0; ch < FEATURES_NUM_CHANNELS; ch++) {
+        out[f++] = sqrt(fmax(sq_sum.sum[ch], 0) / FEATURES_WINDOW);
+    }
+#endif
+#ifdef FEATURES_WL
+    for (size_t ch = 0; ch < FEATURES_NUM_CHANNELS; ch++) {
+        out[f++] = wl_sum.sum[ch];
+    }
+#endif
+#ifdef FEATURES_SSC
+    for (size_t ch = 0; ch < FEATURES_NUM_CHANNELS; ch++) {
+        out[f++] = ssc_sum.sum[ch];
+    }
+#endif
+    return 1;
+}
+
+#endif
@@ -0,0 +1,14 @@
+#include "classifier.h"
+
+#ifdef FEATURES_WINDOW
+
+// Number of raw EMG channels that features are computed from
+#define FEATURES_NUM_CHANNELS 8
+
+// Add a raw sample of FEATURES_NUM_CHANNELS values. Once a whole window has
+// been seen, writes the windowed features into out, which must be
+// CLASSIFIER_NUM_FEATURES long, and returns 1. Otherwise returns 0.
+// Matches FeatureExtractor in the Python code.
+int features_push(const float sample[], float out[]);
+
+#endif
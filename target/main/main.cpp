@@ -8,6 +8,8 @@
 */
 extern "C" {
 #include "predict.h"
+#include "emg_features.h"
+#include "smoothing.h"
 #include "classifier.h"
 }
 
@@ -45,7 +47,53 @@ static uint8_t notificationOn[] = {0x01, 0x00};
 // The boot button
 static const gpio_num_t BUTTON = GPIO_NUM_0;
 
+// Number of EMG channels sent by the Myo
+#define NUM_CHANNELS 8
+
 static float features[CLASSIFIER_NUM_FEATURES];
+static float samples[NUM_CHANNELS];
+static uint16_t raw_samples[NUM_CHANNELS];
+
+// Build with -DBINARY_FRAMES=1 to send EMG data as binary frames instead of
+// _DATA_ text lines, and use the --binary flag on the Python side.
+// A frame is a sync word, the 8 EMG values and a checksum, all little endian
+// uint16. The checksum is the sum of the EMG values truncated to 16 bits.
+#ifndef BINARY_FRAMES
+#define BINARY_FRAMES 0
+#endif
+#define FRAME_SYNC 0x5AA5
+static uint16_t frame[NUM_CHANNELS + 2];
+#if BINARY_FRAMES
+// sdkconfig makes stdout turn every \n into \r\n, which would corrupt any frame
+// with a 0x0A byte, so binary builds switch the console to plain \n
+#include "esp_vfs_dev.h"
+#endif
+
+// Build with -DCLASSIFIER_PARTITION=\"classifier\" to load the classifier from
+// the data partition with that label at startup, so that a new model blob made
+// by `run.py header ... --blob` can be flashed without rebuilding. The compiled
+// in classifier is used if the partition doesn't hold a valid blob.
+#ifdef CLASSIFIER_PARTITION
+#include "esp_partition.h"
+
+// The blob only holds floating point parameters, so once one is loaded the
+// fixed point classifier is no longer used
+static bool classifier_blob_loaded = false;
+
+static uint8_t classifier_blob[CLASSIFIER_BLOB_SIZE];
+
+static void loadClassifierBlob() {
+    const esp_partition_t *partition = esp_partition_find_first(
+        ESP_PARTITION_TYPE_DATA, ESP_PARTITION_SUBTYPE_ANY, CLASSIFIER_PARTITION);
+    if (partition == NULL ||
+            esp_partition_read(partition, 0, classifier_blob, sizeof(classifier_blob)) != ESP_OK ||
+            classifier_load_blob(classifier_blob, sizeof(classifier_blob)) != 0) {
+        dbprintf("No valid classifier blob, using the compiled in classifier\n");
+    } else {
+        classifier_blob_loaded = true;
+    }
+}
+#endif
 
 static void notifyMagicCallback(
   BLERemoteCharacteristic* pBLERemoteCharacteristic, uint8_t* pData, size_t length, bool isNotify) {
@@ -57,19 +105,56 @@ static void notifyMagicCallback(
         run_classifier = true;
     }
 
+#if BINARY_FRAMES
+    uint16_t checksum = 0;
+    frame[0] = FRAME_SYNC;
+    for (size_t i = 0, f = 0; i < 16; i+=2, f++) {
+        // Assume little endian ordering
+        uint16_t emg = (pData[i+1] << 8) | pData[i];
+        samples[f] = emg;
+        raw_samples[f] = emg;
+        frame[f + 1] = emg;
+        checksum += emg;
+    }
+    frame[NUM_CHANNELS + 1] = checksum;
+    // Write the whole frame at once so it isn't interleaved with other prints
+    fwrite(frame, sizeof(frame), 1, stdout);
+    fflush(stdout);
+#else
     // Prevent this print operation from being interrupted by other prints
     // _DATA_ indicates actual EMG data for Python code to pick up
     printf("_DATA_: ");
     for (size_t i = 0, f = 0; i < 16; i+=2, f++) {
         // Assume little endian ordering
         uint16_t emg = (pData[i+1] << 8) | pData[i];
-        features[f] = emg;
+        samples[f] = emg;
+        raw_samples[f] = emg;
         printf("%u ", emg);
     }
     printf("\n");
+#endif
+
+#if defined(FEATURES_WINDOW)
+    // Windowed features need every sample, but only exist after a whole window
+    bool have_features = features_push(samples, features);
+#else
+    bool have_features = true;
+    for (size_t f = 0; f < NUM_CHANNELS; f++) {
+        features[f] = samples[f];
+    }
+#endif
 
-    if (run_classifier) {
+    if (run_classifier && have_features) {
+#if defined(CLASSIFIER_FIXED_BITS) && !defined(FEATURES_WINDOW) && defined(CLASSIFIER_PARTITION)
+        int gesture = classifier_blob_loaded ? classify(features) : classify_fixed(raw_samples);
+#elif defined(CLASSIFIER_FIXED_BITS) && !defined(FEATURES_WINDOW)
+        int gesture = classify_fixed(raw_samples);
+#else
         int gesture = classify(features);
+#endif
+#ifdef SMOOTHING_WINDOW
+        gesture = smoothing_push(gesture);
+#endif
         printf("%d\n", gesture);
     }
 }
@@ -190,6 +275,14 @@ void app_main()
     io_conf.pin_bit_mask = 1ULL << BUTTON;
     gpio_config(&io_conf);
 
+#if BINARY_FRAMES
+    esp_vfs_dev_uart_set_tx_line_endings(ESP_LINE_ENDINGS_LF);
+#endif
+
+#ifdef CLASSIFIER_PARTITION
+    loadClassifierBlob();
+#endif
+
     dbprintf("Starting Arduino BLE Client application...\n");
     BLEDevice::init("");
 
@@ -1,4 +1,6 @@
 #include <stddef.h>
+#include <stdint.h>
+#include <string.h>
 #include "classifier.h"
 #include "predict.h"
 
@@ -44,3 +46,89 @@ int classify(float features[])
     scale_features(features, classifier_offset, classifier_divisor);
     return compute_best_class(features, classifier_weight);
 }
+
+static uint32_t crc32(const uint8_t data[], size_t length)
+{
+    // Bitwise CRC-32, the same as Python's zlib.crc32
+    uint32_t crc = 0xFFFFFFFF;
+    for (size_t i = 0; i < length; i++) {
+        crc ^= data[i];
+        for (int bit = 0; bit < 8; bit++) {
+            crc = (crc >> 1) ^ (0xEDB88320 & -(crc & 1));
+        }
+    }
+    return ~crc;
+}
+
+static uint16_t read_u16(const uint8_t bytes[])
+{
+    return bytes[0] | (bytes[1] << 8);
+}
+
+static uint32_t read_u32(const uint8_t bytes[])
+{
+    return read_u16(bytes) | ((uint32_t)read_u16(bytes + 2) << 16);
+}
+
+int classifier_load_blob(const uint8_t blob[], size_t length)
+{
+    const uint8_t *payload = blob + CLASSIFIER_BLOB_HEADER_SIZE;
+    if (length != CLASSIFIER_BLOB_SIZE ||
+            memcmp(blob, "PACL", 4) != 0 ||
+            read_u16(blob + 4) != CLASSIFIER_BLOB_VERSION ||
+            read_u16(blob + 6) != CLASSIFIER_NUM_FEATURES ||
+            read_u16(blob + 8) != CLASSIFIER_NUM_CLASSES ||
+            read_u32(blob + 12) != crc32(payload, length - CLASSIFIER_BLOB_HEADER_SIZE)) {
+        return -1;
+    }
+
+    // The blob is little endian float32, like the ESP32
+    memcpy(classifier_weight, payload, sizeof(classifier_weight));
+    payload += sizeof(classifier_weight);
+    memcpy(classifier_offset, payload, sizeof(classifier_offset));
+    payload += sizeof(classifier_offset);
+    memcpy(classifier_divisor, payload, sizeof(classifier_divisor));
+    return 0;
+}
+
+#ifdef CLASSIFIER_FIXED_BITS
+
+#if CLASSIFIER_FIXED_BITS == 8
+typedef int8_t fixed_weight_t;
+#else
+typedef int16_t fixed_weight_t;
+#endif
+
+static const fixed_weight_t classifier_fixed_weight[CLASSIFIER_NUM_FEATURES][CLASSIFIER_NUM_CLASSES] =\
+    CLASSIFIER_FIXED_WEIGHT;
+
+static const int32_t classifier_fixed_bias[CLASSIFIER_NUM_CLASSES] = CLASSIFIER_FIXED_BIAS;
+
+static const int32_t classifier_fixed_multiplier[CLASSIFIER_NUM_CLASSES] =\
+    CLASSIFIER_FIXED_MULTIPLIER;
+
+int classify_fixed(const uint16_t features[])
+{
+    int64_t best_score = 0;
+    // -1 means no class has been computed yet
+    int best_class = -1;
+
+    for (size_t cls = 0; cls < CLASSIFIER_NUM_CLASSES; cls++) {
+        int64_t acc = classifier_fixed_bias[cls];
+        for (size_t f = 0; f < CLASSIFIER_NUM_FEATURES; f++) {
+            // Even a 16 bit weight times a 16 bit feature fits in 32 bits
+            acc += (int32_t)classifier_fixed_weight[f][cls] * features[f];
+        }
+        // Bring every class's score to the same scale before comparing
+        int64_t score = acc * classifier_fixed_multiplier[cls];
+
+        if (best_class == -1 || score > best_score) {
+            best_class = cls;
+            best_score = score;
+        }
+    }
+
+    return best_class;
+}
+
+#endif
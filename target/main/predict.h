@@ -1,3 +1,5 @@
+#include <stddef.h>
+#include <stdint.h>
 #include "classifier.h"
 
 // Apply feature scaling. All 3 input arrays must be of length NUM_FEATURES
@@ -9,3 +11,23 @@ int compute_best_class(float features[], const float weight[][CLASSIFIER_NUM_CLA
 
 // Classify unscaled features using the 2 methods above
 int classify(float features[]);
+
+// Model blobs written by LinearClassifier.to_blob(): a 16 byte header of the
+// magic "PACL", the version, the number of features and classes, padding and
+// the CRC-32 of the rest, then the weight, offset and divisor as float32.
+#define CLASSIFIER_BLOB_VERSION 1
+#define CLASSIFIER_BLOB_HEADER_SIZE 16
+#define CLASSIFIER_BLOB_SIZE (CLASSIFIER_BLOB_HEADER_SIZE + 4 * \
+    ((CLASSIFIER_NUM_FEATURES + 1) * CLASSIFIER_NUM_CLASSES + 2 * CLASSIFIER_NUM_FEATURES))
+
+// Replace the compiled in parameters of classify() with those of a model blob,
+// such as one read from flash. The blob must have the same numbers of features
+// and classes. Returns 0 on success, or -1 if the blob is invalid, in which
+// case the parameters are unchanged.
+int classifier_load_blob(const uint8_t blob[], size_t length);
+
+#ifdef CLASSIFIER_FIXED_BITS
+// Classify raw features using only integer arithmetic. The feature scaling is
+// folded into the quantized weights, so the features are used as received.
+int classify_fixed(const uint16_t features[]);
+#endif
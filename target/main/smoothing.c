@@ -0,0 +1,33 @@
+#include <stddef.h>
+#include "smoothing.h"
+
+#ifdef SMOOTHING_WINDOW
+
+// Ring buffer of the last SMOOTHING_WINDOW predictions, of which the first
+// filled are valid, and the running count of each class in it
+static int recent[SMOOTHING_WINDOW];
+static size_t counts[CLASSIFIER_NUM_CLASSES];
+static size_t pos = 0;
+static size_t filled = 0;
+static int current = 0;
+
+int smoothing_push(int prediction)
+{
+    if (filled == SMOOTHING_WINDOW) {
+        counts[recent[pos]]--;
+    } else {
+        filled++;
+    }
+    recent[pos] = prediction;
+    counts[prediction]++;
+    pos = (pos + 1) % SMOOTHING_WINDOW;
+
+    // Only the newest prediction's count went up, so only it can have just
+    // reached the threshold
+    if (counts[prediction] >= SMOOTHING_MIN_VOTES) {
+        current = prediction;
+    }
+    return current;
+}
+
+#endif
@@ -0,0 +1,12 @@
+#include "classifier.h"
+
+#ifdef SMOOTHING_WINDOW
+
+// Add the next predicted class and return the smoothed class. The output
+// switches to a class once at least SMOOTHING_MIN_VOTES of the last
+// SMOOTHING_WINDOW predictions agree on it, and otherwise holds the previous
+// output, starting from class 0. Takes constant time per prediction.
+// Matches PredictionSmoother in the Python code.
+int smoothing_push(int prediction);
+
+#endif